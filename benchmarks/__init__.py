@@ -0,0 +1,31 @@
+""" Micro-benchmarks for the library, runnable without the App Engine runtime:
+
+  python -m yoursway.benchmarks.dispatch
+  
+yoursway.benchmarks.suite runs a representative case of each area and compares it with
+a saved baseline.
+"""
+
+import time
+
+def measure(func, min_time=0.2):
+  """ Calls func repeatedly for at least min_time seconds, returns calls per second. One call is made
+  before timing starts, so that one-time costs like lazy imports and filling caches are not measured. """
+  func()
+  number = 1
+  while True:
+    start = time.time()
+    for i in xrange(number):
+      func()
+    elapsed = time.time() - start
+    if elapsed >= min_time:
+      return number / elapsed
+    number *= 2
+
+def report(name, ops_per_sec):
+  print "%-50s %14.0f ops/sec %10.2f us/op" % (name, ops_per_sec, 1e6 / ops_per_sec)
+
+def run(name, func, min_time=0.2):
+  ops_per_sec = measure(func, min_time)
+  report(name, ops_per_sec)
+  return ops_per_sec
@@ -0,0 +1,53 @@
+""" Requests whose fetchers and before_request hooks wait on simulated I/O (time.sleep),
+run one after another vs. marked independent and run on threads of their own. """
+
+import time
+
+from yoursway.web.handling import YSHandler, fetcher, before_request, independent
+from yoursway.benchmarks import run
+
+# simulated latency of a datastore or URL fetch call, in seconds
+IO_TIME = 0.005
+
+class Request(object):
+  method = 'GET'
+  uri = '/projects/1'
+
+def load_project(handler, key):
+  time.sleep(IO_TIME)
+  handler.project = key
+
+def load_sidebar(handler):
+  time.sleep(IO_TIME)
+  handler.sidebar = None
+
+def check_quota(handler):
+  time.sleep(IO_TIME)
+  handler.quota = 100
+
+def load_notifications(handler):
+  time.sleep(IO_TIME)
+  handler.notifications = []
+
+HOOKS = [load_sidebar, check_quota, load_notifications]
+
+class SequentialHandler(YSHandler):
+  decorators = [fetcher(load_project)] + [before_request(hook) for hook in HOOKS]
+  
+  def get(self, *args):
+    pass
+
+class ConcurrentHandler(YSHandler):
+  decorators = [independent(fetcher(load_project))] + [independent(before_request(hook)) for hook in HOOKS]
+  
+  def get(self, *args):
+    pass
+
+def main():
+  for klass in (SequentialHandler, ConcurrentHandler):
+    handler = klass()
+    handler.request = Request()
+    run("%s, %d hooks x %gms" % (klass.__name__, len(HOOKS) + 1, IO_TIME * 1000), lambda: handler.get('1'), min_time=1.0)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,75 @@
+""" Per-request overhead of YSHandler dispatch: the flat pipeline compiled by
+YSHandlerMetaclass vs. the nested decorator stack it replaced, and the cost of
+per-stage timing instrumentation. """
+
+from yoursway.web.handling import (YSHandler, fetcher, before_request, access_check, instrument,
+  with_stop_request_support, with_request_decoration_support)
+from yoursway.web.instrumentation import HistogramSink
+from yoursway.benchmarks import run
+
+class Request(object):
+  method = 'GET'
+  uri = '/projects/1/docs/2'
+
+@fetcher
+def load_project(handler, key):
+  handler.project = key
+
+@fetcher
+def load_document(handler, key):
+  handler.document = key
+
+@before_request
+def load_sidebar(handler):
+  handler.sidebar = None
+
+@access_check
+def can_view(handler):
+  pass
+
+@access_check
+def can_edit(handler):
+  pass
+
+DECORATORS = [load_project, load_document, load_sidebar, can_view, can_edit]
+
+class FlatHandler(YSHandler):
+  decorators = DECORATORS
+  
+  def get(self, *args):
+    pass
+
+class NestedHandler(object):
+  """ The same handler wired the way YSHandlerMetaclass used to do it. """
+  
+  def base_dispatch_request(self, func, *args, **kw):
+    func(self, *args, **kw)
+    
+  for dec in reversed(DECORATORS):
+    base_dispatch_request = dec(base_dispatch_request)
+  dispatch_request = base_dispatch_request
+  del dec, base_dispatch_request
+  
+  def get(self, *args):
+    pass
+  get = with_stop_request_support(with_request_decoration_support(get))
+
+def main():
+  for klass in (NestedHandler, FlatHandler):
+    handler = klass()
+    handler.request = Request()
+    run("%s, %d decorators" % (klass.__name__, len(DECORATORS)), lambda: handler.get('1', '2'))
+  
+  handler = FlatHandler()
+  handler.request = Request()
+  histograms = HistogramSink()
+  for name, sinks in (('no-op callback', [lambda handler_class, timings, total: None]), ('HistogramSink', [histograms])):
+    instrument(*sinks)
+    try:
+      run("FlatHandler, instrumented, %s" % name, lambda: handler.get('1', '2'))
+    finally:
+      instrument()
+  run("FlatHandler, instrumentation disabled again", lambda: handler.get('1', '2'))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,50 @@
+""" escape/js_str over realistic attribute values, option labels and text blocks,
+compared with the chained-replace implementations they replaced. """
+
+from yoursway.web.utils import escape, escape_many, js_str
+from yoursway.benchmarks import run
+
+def chained_escape(html):
+  if not isinstance(html, unicode):
+    if not isinstance(html, str):
+      html = unicode(html)
+    else:
+      html = unicode(html, 'utf-8')
+  return html.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&#39;')
+
+def chained_js_str(something):
+  if isinstance(something, unicode):
+    text = something
+  elif isinstance(something, str):
+    text = unicode(something, 'utf-8')
+  else:
+    text = unicode(something)
+  return "'" + text.replace("'", "\\'").replace('"', '\\"').replace("\n", "\\n") + "'"
+
+SAMPLES = (
+  ('id attribute', u'project_title'),
+  ('class attribute', u'wide required month-select'),
+  ('option label', u'September'),
+  ('integer value', 2011),
+  ('utf-8 str', 'Caf\xc3\xa9 & Bar'),
+  ('label with entities', u'Tom & Jerry <cartoons>'),
+  ('2 KB text', u'Lorem ipsum dolor sit amet, consectetur adipisicing elit. ' * 35),
+  ('2 KB text with quotes', u'He said "no" & left. ' * 100),
+)
+
+def main():
+  for name, value in SAMPLES:
+    assert escape(value) == chained_escape(value)
+    assert js_str(value) == chained_js_str(value)
+    run("escape, chained: %s" % name, lambda: chained_escape(value))
+    run("escape: %s" % name, lambda: escape(value))
+  for name, value in SAMPLES:
+    run("js_str, chained: %s" % name, lambda: chained_js_str(value))
+    run("js_str: %s" % name, lambda: js_str(value))
+  labels = [u'Option %d' % i for i in range(100)]
+  assert escape_many(labels) == map(chained_escape, labels)
+  run("escape 100 labels, chained", lambda: map(chained_escape, labels))
+  run("escape_many 100 labels", lambda: escape_many(labels))
+
+if __name__ == '__main__':
+  main()
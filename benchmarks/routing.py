@@ -0,0 +1,55 @@
+""" Route matching over synthetic url mappings of 10, 100 and 1000 routes:
+webapp-style linear matching vs. the compiled Router. """
+
+import re
+from yoursway.web.router import Router, first_match, anchor
+from yoursway.benchmarks import run
+
+ROUTE_TEMPLATES = (
+  r'/section%d/',
+  r'/section%d/items/(\d+)',
+  r'/api/v1/resource%d/([^/]+)/?',
+  r'/projects/([^/]+)/page%d/(.*)',
+  r'/(?:static|media)%d/(.+)',
+)
+
+def synthetic_mapping(count):
+  return [(ROUTE_TEMPLATES[i % len(ROUTE_TEMPLATES)] % (i // len(ROUTE_TEMPLATES)), 'handler%d' % i) for i in range(count)]
+
+def synthetic_paths(count):
+  n = count // len(ROUTE_TEMPLATES)
+  return ['/section0/', '/section%d/items/42' % (n-1), '/api/v1/resource%d/abc/' % (n-1),
+          '/projects/x/page%d/y/z' % (n-1), '/media%d/logo.png' % (n-1), '/no/such/page']
+
+# (url mapping, path) pairs the Router once answered differently from first_match
+EDGE_CASES = (
+  ([(r'(z)?q', 'h0'), (r'(a)?(?(1)b|c)', 'h1')], 'ab'),
+)
+
+class LinearRouter(object):
+  """ What webapp does: every regex compiled once, then tried in order. """
+  
+  def __init__(self, url_mapping):
+    self.routes = [(re.compile(anchor(regex)), handler) for regex, handler in url_mapping]
+    
+  def match(self, path):
+    for regex, handler in self.routes:
+      match = regex.match(path)
+      if match is not None:
+        return handler, match.groups()
+    return None
+
+def main():
+  for mapping, path in EDGE_CASES:
+    assert Router(mapping).match(path) == first_match(mapping, path), (mapping, path)
+  for count in (10, 100, 1000):
+    mapping = synthetic_mapping(count)
+    paths = synthetic_paths(count)
+    linear, router = LinearRouter(mapping), Router(mapping)
+    for path in paths:
+      assert router.match(path) == first_match(mapping, path), path
+    for klass, matcher in (('linear', linear), ('Router', router)):
+      run("%4d routes, %-6s (%d paths)" % (count, klass, len(paths)), lambda: map(matcher.match, paths))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,73 @@
+""" utils.sequtil on large inputs: the list-splicing flatten and the list-building slice
+they replaced vs. the current flatten, iflatten and islices, and per-key statistics
+computed from group() vs. aggregate() and aggregate_columns(). """
+
+from yoursway.utils.sequtil import (flatten, iflatten, slice, islices, group,
+  aggregate, aggregate_columns, Count, Sum, Max)
+from yoursway.benchmarks import run
+
+SIZES = (1000, 10000, 50000)
+
+def splicing_flatten(l, ltypes=(list, tuple)):
+  """ flatten as it used to be, quadratic because of the splice assignment. """
+  ltype = type(l)
+  l = list(l)
+  i = 0
+  while i < len(l):
+    while isinstance(l[i], ltypes):
+      if not l[i]:
+        l.pop(i)
+        i -= 1
+        break
+      else:
+        l[i:i + 1] = l[i]
+    i += 1
+  return ltype(l)
+
+def nested_list(size):
+  """ size items like those of a query result grouped into pairs and sub-lists. """
+  return [[i, (i, [i, []])] if i % 3 == 0 else i for i in xrange(size)]
+
+def consume(iterable):
+  for item in iterable:
+    pass
+
+def grouped_stats(rows):
+  """ The statistics aggregate() computes below, obtained the way reports used to. """
+  result = {}
+  for key, bucket in group(lambda row: row[0], rows).iteritems():
+    values = [row[1] for row in bucket]
+    result[key] = dict(count=len(values), total=sum(values), largest=max(values))
+  return result
+
+def main():
+  for size in SIZES:
+    data = nested_list(size)
+    assert splicing_flatten(data) == flatten(data) == list(iflatten(data))
+    run("splicing flatten, %d items" % size, lambda: splicing_flatten(data), min_time=0.5)
+    run("flatten, %d items" % size, lambda: flatten(data))
+    run("iflatten, %d items" % size, lambda: consume(iflatten(data)))
+  for size in SIZES:
+    data = range(size * 10)
+    run("slice(100), %d items" % len(data), lambda: slice(100, data))
+    run("islices(100), %d items" % len(data), lambda: consume(islices(100, data)))
+  rows = [(i % 100, i) for i in xrange(100000)]
+  keys, values = [row[0] for row in rows], [row[1] for row in rows]
+  value = lambda row: row[1]
+  assert grouped_stats(rows) == aggregate(lambda row: row[0], rows, count=Count(), total=Sum(value),
+    largest=Max(value)) == aggregate_columns(keys, values, count=Count(), total=Sum(), largest=Max())
+  run("group + statistics, %d rows" % len(rows), lambda: grouped_stats(rows))
+  run("aggregate, %d rows" % len(rows), lambda: aggregate(lambda row: row[0], rows,
+    count=Count(), total=Sum(lambda row: row[1]), largest=Max(lambda row: row[1])))
+  run("aggregate, shared value func, %d rows" % len(rows), lambda: aggregate(lambda row: row[0], rows,
+    count=Count(), total=Sum(value), largest=Max(value)))
+  try:
+    import numpy
+    keys, values = numpy.array(keys), numpy.array(values)
+  except ImportError:
+    pass
+  run("aggregate_columns, %d rows (%s)" % (len(rows), type(keys).__name__), lambda: aggregate_columns(keys, values,
+    count=Count(), total=Sum(), largest=Max()))
+
+if __name__ == '__main__':
+  main()
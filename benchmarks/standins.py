@@ -0,0 +1,52 @@
+""" In-memory stand-ins for the webapp request, response and handler base class, enough
+to drive YSHandler without the App Engine runtime. For the users API use
+yoursway.web.requestcontext.InMemoryUsers. """
+
+from StringIO import StringIO
+from wsgiref.headers import Headers
+
+class Request(object):
+  """ A GET or POST request with the given path, query/form arguments and headers. """
+  
+  def __init__(self, path='/', params=None, headers=None, method='GET', host='http://localhost'):
+    self.method = method
+    self.path = path
+    self.url = self.uri = host + path
+    self.params = dict(params or {})
+    self.headers = dict(headers or {})
+    
+  def get(self, name, default_value=''):
+    return self.params.get(name, default_value)
+    
+  def arguments(self):
+    return self.params.keys()
+
+class Response(object):
+  
+  def __init__(self):
+    self.out = StringIO()
+    self.headers = Headers([('Content-Type', 'text/html; charset=utf-8')])
+    self.status = 200
+    
+  def set_status(self, code, message=None):
+    self.status = code
+    
+  def clear(self):
+    self.out.seek(0)
+    self.out.truncate(0)
+
+class RequestHandler(object):
+  """ The parts of webapp.RequestHandler that YSHandler relies on. """
+  
+  def initialize(self, request, response):
+    self.request = request
+    self.response = response
+    
+  def error(self, code):
+    self.response.set_status(code)
+    self.response.clear()
+    
+  def redirect(self, uri, permanent=False):
+    self.response.set_status(301 if permanent else 302)
+    self.response.headers['Location'] = str(uri)
+    self.response.clear()
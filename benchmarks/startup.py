@@ -0,0 +1,38 @@
+""" Cold-start cost of importing the main entry points: wall time and number of modules
+loaded, each measured in a fresh interpreter, plus the heavy third-party packages
+(which should only be imported on first use) that the import pulled in. """
+
+import os
+import sys
+import subprocess
+
+MODULES = ('yoursway.web.handling', 'yoursway.web.validation', 'yoursway.gae.utils')
+HEAVY_PACKAGES = ('decorator', 'django', 'google.appengine', 'numpy')
+REPEAT = 5
+
+PROBE = """
+import sys, time
+before = set(sys.modules)
+start = time.time()
+__import__(%(module)r)
+elapsed = time.time() - start
+loaded = [name for name in set(sys.modules) - before if sys.modules[name] is not None]
+heavy = [package for package in %(heavy)r if package in sys.modules]
+print elapsed, len(loaded), ','.join(heavy)
+"""
+
+def probe(module):
+  """ Returns (seconds, modules loaded, heavy packages loaded) for importing module in a new interpreter. """
+  env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+  output = subprocess.check_output([sys.executable, '-c', PROBE % dict(module=module, heavy=HEAVY_PACKAGES)], env=env)
+  elapsed, count, heavy = (output.strip().split(' ') + [''])[:3]
+  return float(elapsed), int(count), heavy
+
+def main():
+  for module in MODULES:
+    results = [probe(module) for i in xrange(REPEAT)]
+    elapsed, count, heavy = min(results)
+    print "%-50s %10.2f ms %6d modules   heavy: %s" % (module, elapsed * 1000, count, heavy or '-')
+
+if __name__ == '__main__':
+  main()
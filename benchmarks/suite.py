@@ -0,0 +1,189 @@
+""" The library's per-call overhead in one run, using in-memory stand-ins for the App Engine
+runtime: YSHandler dispatch and error handling, request validation, HTML rendering and
+the sequtil/dateutil helpers.
+
+  python -m yoursway.benchmarks.suite --save baseline.json      # record a baseline
+  python -m yoursway.benchmarks.suite --compare baseline.json   # flag regressions against it
+
+Besides ops/sec, every case gets a leak check: the GC-tracked objects a call leaves alive
+(the growth of gc.get_objects() with the collector off), which catches growing caches and
+garbage kept by mistake. It is not an allocation count, which Python 2 cannot provide, and
+is normally 0. With --compare, the exit status is 1 if any case got slower than the
+tolerance allows or leaks more objects. """
+
+import gc
+import sys
+import json
+import random
+import optparse
+from datetime import date, timedelta
+
+from yoursway.web.handling import (YSHandler, fetcher, before_request, access_check,
+  NotFound, AccessDenied, BadRequest)
+from yoursway.web.requestcontext import InMemoryUsers
+from yoursway.web.validation import PostbackSession, valid_string, valid_int
+from yoursway.web.forms import render_tag, render_select
+from yoursway.web.utils import escape
+from yoursway.utils import sequtil, dateutil
+from yoursway.benchmarks import measure
+from yoursway.benchmarks.standins import Request, Response, RequestHandler
+
+# a case is reported as slower when its ops/sec drop by more than this fraction
+TOLERANCE = 0.15
+# ...or as leaking when it leaves this many more objects alive per call
+OBJECTS_TOLERANCE = 0.5
+
+@fetcher
+def load_project(handler, key):
+  handler.project = key
+
+@fetcher
+def load_document(handler, key):
+  handler.document = key
+
+@before_request
+def load_sidebar(handler):
+  handler.sidebar = ()
+
+@access_check
+def can_view(handler):
+  if handler.request_context.current_user is None:
+    raise AccessDenied
+
+@access_check
+def can_edit(handler):
+  if not handler.request_context.is_admin:
+    raise AccessDenied
+
+class ProjectHandler(YSHandler, RequestHandler):
+  decorators = (load_project, load_document, load_sidebar, can_view, can_edit)
+  users_api = InMemoryUsers(user='john@example.com', admin=True)
+
+  def get(self, *args):
+    self.response.out.write('ok')
+
+class AnonymousProjectHandler(ProjectHandler):
+  users_api = InMemoryUsers()
+
+def handle(klass, request, *args):
+  """ Handles a request the way webapp does: a new handler and response for each request. """
+  handler = klass()
+  handler.initialize(request, Response())
+  handler.get(*args)
+  return handler
+
+def dispatch_exception(request, exception):
+  handler = ProjectHandler()
+  handler.initialize(request, Response())
+  handler.dispatch_exception(exception, False)
+
+def validate(request):
+  session = PostbackSession(request)
+  valid_string(session, 'title', max_len=100)
+  valid_string(session, 'description', required=False)
+  valid_int(session, 'count', min_value=0, max_value=1000)
+  valid_int(session, 'priority', required=False, missing_value=-1)
+  return session
+
+def build_cases():
+  """ Returns a list of (name, function) pairs. """
+  get = Request('/projects/1/docs/2')
+  post = Request('/projects/1', method='POST', params=dict(title=' Roadmap ', description='', count='42', priority='-1'))
+  bad_post = Request('/projects/1', method='POST', params=dict(title='x' * 200, count='many', priority='3'))
+
+  options = [dict(name='Option %d' % i, value=i) for i in xrange(20)]
+  short_text = u'Tom & Jerry <"cartoon">'
+  long_text = short_text * 50
+
+  rows = [(i % 50, i) for i in xrange(1000)]
+  nested = [[i, (i, [i])] if i % 3 == 0 else i for i in xrange(1000)]
+  dates = [date(2010, 1, 1) + timedelta(days=random.Random(i).randint(0, 3650)) for i in xrange(1000)]
+
+  cases = [
+    ("dispatch: 2 fetchers, before_request, 2 checks", lambda: handle(ProjectHandler, get, '1', '2')),
+    ("dispatch: access denied, login redirect", lambda: handle(AnonymousProjectHandler, get, '1', '2')),
+  ]
+  for exception in (NotFound(), AccessDenied(), BadRequest(), ValueError()):
+    cases.append(("dispatch_exception: %s" % exception.__class__.__name__,
+                  lambda exception=exception: dispatch_exception(get, exception)))
+  cases += [
+    ("validation: 4 valid fields", lambda: validate(post)),
+    ("validation: 3 invalid fields", lambda: validate(bad_post)),
+    ("render_tag: <a> with 2 attributes", lambda: render_tag('a', short_text, href='/projects/1', klass='project')),
+    ("render_select: 20 options", lambda: render_select(options, value=7, name='choice')),
+    ("escape: %d chars" % len(short_text), lambda: escape(short_text)),
+    ("escape: %d chars" % len(long_text), lambda: escape(long_text)),
+    ("sequtil.group: 1000 items", lambda: sequtil.group(lambda row: row[0], rows)),
+    ("sequtil.index: 1000 items", lambda: sequtil.index(lambda row: row[1], rows)),
+    ("sequtil.islices(100): 1000 items", lambda: list(sequtil.islices(100, rows))),
+    ("sequtil.flatten: 1000 nested items", lambda: sequtil.flatten(nested)),
+    ("sequtil.aggregate: 1000 items, 3 reducers", lambda: sequtil.aggregate(lambda row: row[0], rows,
+      count=sequtil.Count(), total=sequtil.Sum(lambda row: row[1]), last=sequtil.Last())),
+    ("dateutil.date_to_week", lambda: dateutil.date_to_week(dates[0])),
+    ("dateutil.next_week", lambda: dateutil.next_week(201052, 3)),
+    ("dateutil.WeekRange: 5 years", lambda: list(dateutil.WeekRange(201001, 201501))),
+    ("dateutil.dates_to_weeks: 1000 dates", lambda: dateutil.dates_to_weeks(dates)),
+  ]
+  return cases
+
+def retained_objects(func, calls=1000):
+  """ Returns the number of GC-tracked objects left alive per call. """
+  func()  # fill caches first
+  gc.collect()
+  gc.disable()
+  try:
+    before = len(gc.get_objects())
+    for i in xrange(calls):
+      func()
+    after = len(gc.get_objects())
+  finally:
+    gc.enable()
+  return (after - before) / float(calls)
+
+def compare(result, baseline):
+  """ Returns (description, regressed) of a case's result against its baseline entry. """
+  if baseline is None:
+    return 'new', False
+  change = result['ops'] / baseline['ops'] - 1
+  slower = change < -TOLERANCE
+  leaking = result['objects'] > baseline['objects'] + OBJECTS_TOLERANCE
+  flags = [flag for flag, on in (('SLOWER', slower), ('LEAKING', leaking)) if on]
+  return ' '.join(['%+6.1f%%' % (change * 100)] + flags), slower or leaking
+
+def main(argv=None):
+  parser = optparse.OptionParser(usage="%prog [options]")
+  parser.add_option('-t', '--time', type='float', default=0.2, help="seconds to spend on each case")
+  parser.add_option('-k', '--filter', default='', help="only run cases whose name contains this text")
+  parser.add_option('--save', metavar='FILE', help="write the results to a baseline file")
+  parser.add_option('--compare', metavar='FILE', help="compare the results with a baseline file")
+  options, args = parser.parse_args(argv)
+
+  baseline = None
+  if options.compare:
+    with open(options.compare) as f:
+      baseline = json.load(f)
+
+  results = {}
+  regressions = 0
+  for name, func in build_cases():
+    if options.filter not in name:
+      continue
+    ops = measure(func, options.time)
+    result = results[name] = dict(ops=ops, objects=retained_objects(func))
+    line = "%-50s %14.0f ops/sec %10.2f us/op %8.2f leaked objs/call" % (name, ops, 1e6 / ops, result['objects'])
+    if baseline is not None:
+      description, regressed = compare(result, baseline.get(name))
+      line += "   " + description
+      regressions += regressed
+    print line
+
+  if options.save:
+    with open(options.save, 'w') as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+  if regressions:
+    print "%d case(s) regressed against %s" % (regressions, options.compare)
+    return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,22 @@
+""" Random token generation: the Random().sample based random_string it replaced
+vs. the buffered CSPRNG random_string and random_strings. """
+
+import string
+from random import Random
+
+from yoursway.utils.stringutil import random_string, random_strings
+from yoursway.benchmarks import run, measure, report
+
+def sampled_random_string(len=12, chars=string.letters+string.digits):
+  """ random_string as it used to be (always 12 characters, never repeating one). """
+  return ''.join(Random().sample(chars, 12))
+
+def main():
+  run("old random_string(12)", lambda: sampled_random_string(12))
+  for length in (12, 32):
+    run("random_string(%d)" % length, lambda: random_string(length))
+  for length in (12, 32):
+    report("random_strings(1000, %d), per token" % length, measure(lambda: random_strings(1000, length)) * 1000)
+  
+if __name__ == '__main__':
+  main()
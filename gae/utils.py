@@ -1,9 +1,8 @@
 
-from google.appengine.api import users
-
 from yoursway.web.handling import can_redirect, access_check, Redirect, AccessDenied
+from yoursway.web.requestcontext import request_context_of
 
 @access_check
 def requires_admin(handler):
-  if not users.is_current_user_admin():
+  if not request_context_of(handler).is_admin:
     raise AccessDenied
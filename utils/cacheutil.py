@@ -0,0 +1,42 @@
+__all__ = ['LRUCache']
+
+import threading
+from collections import OrderedDict
+
+class LRUCache(object):
+  """ A thread-safe mapping that keeps at most max_size most recently used items. """
+  
+  def __init__(self, max_size=100):
+    self.max_size = max_size
+    self.items = OrderedDict()
+    self.lock = threading.Lock()
+    
+  def get(self, key, default=None):
+    with self.lock:
+      try:
+        value = self.items.pop(key)
+      except KeyError:
+        return default
+      self.items[key] = value
+      return value
+      
+  def set(self, key, value):
+    with self.lock:
+      self.items.pop(key, None)
+      self.items[key] = value
+      if len(self.items) > self.max_size:
+        self.items.popitem(last=False)
+        
+  def delete(self, key):
+    with self.lock:
+      self.items.pop(key, None)
+      
+  def clear(self):
+    with self.lock:
+      self.items.clear()
+      
+  def __contains__(self, key):
+    return key in self.items
+    
+  def __len__(self):
+    return len(self.items)
@@ -1,4 +1,7 @@
 
+# enables round-trip checks of computed dates against date.isocalendar()
+DEBUG = False
+
 def date_to_week(d):
   iso_year, iso_week, iso_weekday = d.isocalendar()
   return iso_year * 100 + iso_week
@@ -10,8 +13,7 @@ def week_to_end_date(w):
   return iso_year_week_day_to_date(int(w / 100), w % 100, 7)
   
 def next_week(w, offset=1):
-  from datetime import timedelta
-  return date_to_week(week_to_start_date(w) + timedelta(days=7*offset))
+  return add_weeks(w, offset)
   
 def previous_week(w, offset=1):
   return next_week(w, -offset)
@@ -25,5 +27,171 @@ def iso_year_week_day_to_date(y, w, d):
   # if jan4_monday_offset == 0: jan4_monday_offset = 7
   
   result = jan4 + timedelta(days=(-jan4_monday_offset + 7*(w-1) + (d-1)))
-  assert result.isocalendar() == (y, w, d)
+  if DEBUG:
+    assert result.isocalendar() == (y, w, d)
+  return result
+
+# date(1970, 1, 1).toordinal(), day 0 of datetime64[D]
+EPOCH_ORDINAL = 719163
+
+def weeks_in_year(y):
+  """ 53 if the ISO year starts on a Thursday, or on a Wednesday in a leap year; 52 otherwise. """
+  def dec31_weekday(year):
+    return (year + year // 4 - year // 100 + year // 400) % 7
+  return (53 if dec31_weekday(y) == 4 or dec31_weekday(y - 1) == 3 else 52)
+
+MAX_YEAR = 9999
+
+# YEAR_FIRST_WEEK[y] is the week ordinal (weeks since 0001-W01) of yyyy-W01, for y in 1..MAX_YEAR+1
+YEAR_FIRST_WEEK = []
+
+def year_first_week():
+  if not YEAR_FIRST_WEEK:
+    table = [0, 0]
+    for y in xrange(1, MAX_YEAR + 1):
+      table.append(table[-1] + weeks_in_year(y))
+    YEAR_FIRST_WEEK[:] = table
+  return YEAR_FIRST_WEEK
+
+def week_to_ordinal(w):
+  """ Returns the number of weeks between 0001-W01 and the given yyyyww week id. Week numbers beyond the
+  year's last week (or below 1) count into the next (previous) year, the way week_to_start_date treats them. """
+  return year_first_week()[w // 100] + w % 100 - 1
+
+def ordinal_to_week(n):
+  table = year_first_week()
+  if not 0 <= n < table[MAX_YEAR + 1]:
+    raise OverflowError, "week ordinal %d is out of range" % n
+  y = int(n / 52.1775) + 1  # 52.1775 weeks per year on average
+  while table[y] > n:
+    y -= 1
+  while table[y + 1] <= n:
+    y += 1
+  return y * 100 + n - table[y] + 1
+
+def add_weeks(w, offset):
+  return ordinal_to_week(week_to_ordinal(w) + offset)
+
+def weeks_between(w1, w2):
+  """ Returns the number of weeks from w1 to w2 (negative if w2 comes first). """
+  return week_to_ordinal(w2) - week_to_ordinal(w1)
+
+class WeekRange(object):
+  """ The week ids from start up to, but not including, stop (with an optional step), like xrange:
+  
+    WeekRange(201050, 201103) -> 201050, 201051, 201052, 201101, 201102
+  
+  Supports len(), 'in', indexing and slicing without materializing the weeks. """
+  
+  def __init__(self, start, stop, step=1):
+    if step == 0:
+      raise ValueError, "WeekRange step must not be zero"
+    self.first = week_to_ordinal(start)
+    self.step = step
+    self.length = len(xrange(self.first, week_to_ordinal(stop), step))
+    
+  @classmethod
+  def from_ordinals(cls, first, step, length):
+    result = cls.__new__(cls)
+    result.first, result.step, result.length = first, step, length
+    return result
+    
+  def __len__(self):
+    return self.length
+    
+  def __iter__(self):
+    if self.length == 0:
+      return
+    if self.step != 1:
+      for n in xrange(self.first, self.first + self.step * self.length, self.step):
+        yield ordinal_to_week(n)
+      return
+    w = ordinal_to_week(self.first)
+    y, week = w // 100, w % 100
+    last_week = weeks_in_year(y)
+    for i in xrange(self.length):
+      yield y * 100 + week
+      week += 1
+      if week > last_week:
+        y, week = y + 1, 1
+        last_week = weeks_in_year(y)
+        
+  def __contains__(self, w):
+    if not isinstance(w, (int, long)):
+      return False
+    n = week_to_ordinal(w)
+    offset, remainder = divmod(n - self.first, self.step)
+    return remainder == 0 and 0 <= offset < self.length and ordinal_to_week(n) == w
+    
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      start, stop, step = index.indices(self.length)
+      return WeekRange.from_ordinals(self.first + start * self.step, self.step * step, len(xrange(start, stop, step)))
+    if index < 0:
+      index += self.length
+    if not 0 <= index < self.length:
+      raise IndexError, "WeekRange index out of range"
+    return ordinal_to_week(self.first + index * self.step)
+    
+  def key(self):
+    # empty ranges are all equal, and so are one-week ranges differing only in step
+    return (self.first if self.length else None, self.step if self.length > 1 else None, self.length)
+    
+  def __eq__(self, other):
+    return isinstance(other, WeekRange) and self.key() == other.key()
+    
+  def __ne__(self, other):
+    return not self == other
+    
+  def __hash__(self):
+    return hash(self.key())
+    
+  def __repr__(self):
+    if self.length == 0:
+      return 'WeekRange(empty)'
+    return 'WeekRange(%d, %d, %d weeks)' % (self[0], self[-1], self.length)
+
+def import_numpy():
+  try:
+    import numpy
+    return numpy
+  except ImportError:
+    return None
+
+def dates_to_weeks(dates):
+  """ Bulk date_to_week: takes a sequence of dates (or datetimes) or a NumPy datetime64 array,
+  returns an integer array of yyyyww week ids (a list when NumPy is not installed). """
+  numpy = import_numpy()
+  if numpy is None:
+    return [date_to_week(d) for d in dates]
+  if isinstance(dates, numpy.ndarray):
+    days = dates.astype('datetime64[D]').astype(numpy.int64)
+  else:
+    # much faster than having NumPy convert date objects
+    days = numpy.fromiter((d.toordinal() for d in dates), numpy.int64) - EPOCH_ORDINAL
+  # ISO weeks belong to the year of their Thursday; 1970-01-01 was a Thursday
+  thursdays = days - (days + 3) % 7 + 3
+  years = thursdays.astype('datetime64[D]').astype('datetime64[Y]')
+  weeks = (thursdays - years.astype('datetime64[D]').astype(numpy.int64)) // 7 + 1
+  return (years.astype(numpy.int64) + 1970) * 100 + weeks
+
+def weeks_to_dates(weeks, weekday):
+  numpy = import_numpy()
+  if numpy is None:
+    return [iso_year_week_day_to_date(int(w / 100), w % 100, weekday) for w in weeks]
+  weeks = numpy.asarray(weeks, dtype=numpy.int64)
+  years = (weeks // 100 - 1970).astype('datetime64[Y]')
+  jan4 = years.astype('datetime64[D]').astype(numpy.int64) + 3
+  days = jan4 - (jan4 + 3) % 7 + 7 * (weeks % 100 - 1) + (weekday - 1)
+  result = days.astype('datetime64[D]')
+  if DEBUG:
+    assert (dates_to_weeks(result) == weeks).all()
   return result
+
+def weeks_to_start_dates(weeks):
+  """ Bulk week_to_start_date: returns a datetime64[D] array of the Mondays (a list of dates without NumPy). """
+  return weeks_to_dates(weeks, 1)
+
+def weeks_to_end_dates(weeks):
+  """ Bulk week_to_end_date: returns a datetime64[D] array of the Sundays (a list of dates without NumPy). """
+  return weeks_to_dates(weeks, 7)
@@ -1,5 +1,5 @@
 
-__all__ = ['non_sig_preserving_decorator']
+__all__ = ['non_sig_preserving_decorator', 'memoized_property']
 
 import functools
 
@@ -11,3 +11,17 @@ def non_sig_preserving_decorator(decorator_wannabe):
       return decorator_wannabe(func, *args, **kw)
     return decorated
   return decorator_in_law
+
+class memoized_property(object):
+  """ A property computed on first access and then stored in the instance __dict__. """
+  
+  def __init__(self, func):
+    self.func = func
+    self.__name__ = func.__name__
+    self.__doc__ = func.__doc__
+    
+  def __get__(self, obj, klass=None):
+    if obj is None:
+      return self
+    value = obj.__dict__[self.__name__] = self.func(obj)
+    return value
@@ -0,0 +1,39 @@
+""" Lazy imports of heavy or platform-specific modules (decorator, Django, App Engine APIs),
+so that importing the package stays cheap for code paths that never use them:
+
+  users = lazy_import('google.appengine.api.users')
+  ...
+  users.get_current_user()   # google.appengine.api.users is imported here
+"""
+
+__all__ = ['lazy_import', 'LazyModule']
+
+import sys
+import types
+
+class LazyModule(types.ModuleType):
+  """ Stands in for a module, importing it on first attribute access. """
+
+  def __init__(self, name):
+    super(LazyModule, self).__init__(name)
+    self.__dict__['_module'] = None
+
+  def _load(self):
+    module = self.__dict__['_module']
+    if module is None:
+      __import__(self.__name__)
+      module = self.__dict__['_module'] = sys.modules[self.__name__]
+    return module
+
+  def __getattr__(self, name):
+    return getattr(self._load(), name)
+
+  def __repr__(self):
+    return "<lazy module %r%s>" % (self.__name__, ('' if self.__dict__['_module'] is None else ', loaded'))
+
+def lazy_import(name):
+  """ Returns the module if it is already imported, a LazyModule standing in for it otherwise. """
+  module = sys.modules.get(name)
+  if module is not None:
+    return module
+  return LazyModule(name)
@@ -1,3 +1,7 @@
+import heapq
+import itertools
+
+from yoursway.utils.funcutil import memoized_property
   
 def index_by_key(entities):
   return index(lambda e: e.key(), entities)
@@ -16,23 +20,354 @@ def slice(count, iterable):
         result[-1].append(i)
     return result
     
+def islices(count, iterable):
+    """ Lazy slice(): yields lists of count items (the last one may be shorter), consuming the iterable as it goes. """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, count))
+        if not chunk:
+            return
+        yield chunk
+    
 def index(func, iterable):
     result = {}
     for i in iterable:
         result[func(i)] = i
     return result
   
+class Reducer(object):
+  """ Folds the items of one group into a single result: start(item) makes the state from the first item,
+  step(state, item) returns the state updated with a further one, finish(state) turns it into the result.
+  func, if given, maps an item to the value being reduced; reducers given the same func object
+  in one aggregate() call share a single func(item) call per item. """
+  
+  def __init__(self, func=None):
+    self.func = func
+    
+  def value(self, item):
+    return (item if self.func is None else self.func(item))
+    
+  def start(self, item):
+    return self.value(item)
+    
+  def finish(self, state):
+    return state
+    
+  def step_source(self, i, value):
+    """ Returns source code doing state[i] = self.step(state[i], item) inline, where value is
+    an expression for self.value(item), or None. """
+    return None
+    
+class Count(Reducer):
+  
+  def start(self, item):
+    return 1
+    
+  def step(self, state, item):
+    return state + 1
+    
+  def step_source(self, i, value):
+    return 'state[%d] += 1' % i
+    
+  def reduce_array(self, groups):
+    return groups.counts
+    
+class Sum(Reducer):
+  
+  def step(self, state, item):
+    return state + self.value(item)
+    
+  def step_source(self, i, value):
+    return 'state[%d] += %s' % (i, value)
+    
+  def reduce_array(self, groups):
+    return groups.sums
+    
+class Min(Reducer):
+  
+  def step(self, state, item):
+    value = self.value(item)
+    return (value if value < state else state)
+    
+  def step_source(self, i, value):
+    return 'value = %s\nif value < state[%d]: state[%d] = value' % (value, i, i)
+    
+  def reduce_array(self, groups):
+    return groups.mins
+    
+class Max(Reducer):
+  
+  def step(self, state, item):
+    value = self.value(item)
+    return (value if value > state else state)
+    
+  def step_source(self, i, value):
+    return 'value = %s\nif value > state[%d]: state[%d] = value' % (value, i, i)
+    
+  def reduce_array(self, groups):
+    return groups.maxes
+    
+class MinBy(Reducer):
+  """ The first item with the smallest func(item). """
+  
+  def start(self, item):
+    return (self.func(item), item)
+    
+  def step(self, state, item):
+    value = self.func(item)
+    return ((value, item) if value < state[0] else state)
+    
+  def step_source(self, i, value):
+    return 'value = %s\nif value < state[%d][0]: state[%d] = (value, item)' % (value, i, i)
+    
+  def finish(self, state):
+    return state[1]
+    
+class MaxBy(MinBy):
+  """ The first item with the largest func(item). """
+  
+  def step(self, state, item):
+    value = self.func(item)
+    return ((value, item) if value > state[0] else state)
+    
+  def step_source(self, i, value):
+    return 'value = %s\nif value > state[%d][0]: state[%d] = (value, item)' % (value, i, i)
+    
+class First(Reducer):
+  
+  def step(self, state, item):
+    return state
+    
+  def step_source(self, i, value):
+    return 'pass'
+    
+  def reduce_array(self, groups):
+    return groups.firsts
+    
+class Last(Reducer):
+  
+  def step(self, state, item):
+    return self.value(item)
+    
+  def step_source(self, i, value):
+    return 'state[%d] = %s' % (i, value)
+    
+  def reduce_array(self, groups):
+    return groups.lasts
+    
+class TopK(Reducer):
+  """ The k items with the largest func(item), largest first; equal ones in their original order
+  (same as sorted(items, key=func, reverse=True)[:k]). Keeps a heap of at most k items. """
+  
+  def __init__(self, k, func=None):
+    if k < 1:
+      raise ValueError, "TopK needs k of at least 1"
+    super(TopK, self).__init__(func)
+    self.k = k
+    self.counter = itertools.count()
+    
+  def start(self, item):
+    return [(self.value(item), -self.counter.next(), item)]
+    
+  def step(self, state, item):
+    entry = (self.value(item), -self.counter.next(), item)
+    if len(state) < self.k:
+      heapq.heappush(state, entry)
+    elif entry > state[0]:
+      heapq.heapreplace(state, entry)
+    return state
+    
+  def finish(self, state):
+    return [item for value, order, item in sorted(state, reverse=True)]
+
+def defining_class(obj, name):
+  for klass in type(obj).__mro__:
+    if name in klass.__dict__:
+      return klass
+
+def reducer_step_source(reducer, i, value):
+  # a step_source inherited from a class that a subclass has overridden step() in would be wrong
+  if issubclass(defining_class(reducer, 'step_source'), defining_class(reducer, 'step')):
+    return reducer.step_source(i, value)
+  return None
+
+def func_numbers(reducers):
+  """ Numbers the distinct funcs of the reducers; returns the number of each reducer's func, or None. """
+  numbers = {}
+  return [(None if reducer.func is None else numbers.setdefault(id(reducer.func), len(numbers))) for reducer in reducers]
+
+# (keyed, ((reducer class, func number), ...)) -> compiled fold function
+FOLD_FUNCTIONS = {}
+
+def compile_fold(reducers, keyed):
+  """ Returns fold(items, key_func, reducers) -> {key: [state]} with the loop body generated for the given
+  reducers; items are (key, item) pairs, or items to call key_func on when keyed. """
+  funcs = func_numbers(reducers)
+  signature = (keyed, tuple((type(reducer), func) for reducer, func in zip(reducers, funcs)))
+  fold = FOLD_FUNCTIONS.get(signature)
+  if fold is not None:
+    return fold
+  # a func shared by several inline steps is called once per item, into v<func number>
+  users = {}
+  for i, reducer in enumerate(reducers):
+    if funcs[i] is not None and reducer_step_source(reducer, i, 'value') is not None:
+      users.setdefault(funcs[i], []).append(i)
+  shared = dict((func, indices[0]) for func, indices in users.iteritems() if len(indices) > 1)
+  lines = ['def fold(items, key_func, reducers):']
+  for i in range(len(reducers)):
+    lines.append('  r%d = reducers[%d]; f%d = r%d.func; start%d = r%d.start' % (i, i, i, i, i, i))
+  lines.append('  states = {}')
+  if keyed:
+    lines.append('  for item in items:')
+    lines.append('    key = key_func(item)')
+  else:
+    lines.append('  for key, item in items:')
+  lines.append('    try:')
+  lines.append('      state = states[key]')
+  lines.append('    except KeyError:')
+  lines.append('      states[key] = [%s]' % ', '.join('start%d(item)' % i for i in range(len(reducers))))
+  lines.append('    else:')
+  for func, i in sorted(shared.iteritems()):
+    lines.append('      v%d = f%d(item)' % (func, i))
+  for i, reducer in enumerate(reducers):
+    if funcs[i] is None:
+      value = 'item'
+    elif funcs[i] in shared:
+      value = 'v%d' % funcs[i]
+    else:
+      value = 'f%d(item)' % i
+    source = reducer_step_source(reducer, i, value) or 'state[%d] = r%d.step(state[%d], item)' % (i, i, i)
+    for line in source.split('\n'):
+      lines.append('      ' + line)
+  if not reducers:
+    lines.append('      pass')
+  lines.append('  return states')
+  namespace = {}
+  exec compile('\n'.join(lines) + '\n', '<compiled fold>', 'exec') in namespace
+  fold = FOLD_FUNCTIONS[signature] = namespace['fold']
+  return fold
+
+def fold(items, reducers, key_func=None):
+  """ Runs {name: reducer} over (key, item) pairs, or over items keyed by key_func; returns {key: {name: result}}. """
+  names = reducers.keys()
+  reducers = [reducers[name] for name in names]
+  states = compile_fold(reducers, key_func is not None)(items, key_func, reducers)
+  return dict((key, dict((name, reducer.finish(value)) for name, reducer, value in zip(names, reducers, state)))
+              for key, state in states.iteritems())
+
+def aggregate(func, iterable, **reducers):
+  """ Like group(), but reducing each group as items stream by instead of keeping them, e.g.
+  
+    aggregate(lambda e: e.project, entities, count=Count(), size=Sum(lambda e: e.size), latest=MaxBy(lambda e: e.date))
+    
+  returns {project: {'count': ..., 'size': ..., 'latest': ...}}. func may also be a tuple of key functions,
+  making the keys tuples. Memory use is bounded by the number of keys (and the k items kept by TopK).
+  Each distinct func is called once per item, so pass reducers of the same value the same function. """
+  if isinstance(func, (list, tuple)):
+    funcs = func
+    func = lambda item: tuple(f(item) for f in funcs)
+  return fold(iterable, reducers, func)
+
+class ArrayGroups(object):
+  """ Per-key statistics of a values array grouped by a parallel keys array, computed with NumPy
+  from a single stable sort of the keys. """
+  
+  def __init__(self, numpy, keys, values):
+    self.numpy = numpy
+    order = keys.argsort(kind='mergesort')
+    sorted_keys = keys[order]
+    boundaries = numpy.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    self.starts = numpy.concatenate(([0], boundaries))
+    self.ends = numpy.concatenate((boundaries, [len(keys)]))
+    self.keys = sorted_keys[self.starts]
+    self.values = values[order]
+    
+  @memoized_property
+  def counts(self):
+    return self.ends - self.starts
+    
+  @memoized_property
+  def sums(self):
+    return self.numpy.add.reduceat(self.values, self.starts)
+    
+  @memoized_property
+  def mins(self):
+    return self.numpy.minimum.reduceat(self.values, self.starts)
+    
+  @memoized_property
+  def maxes(self):
+    return self.numpy.maximum.reduceat(self.values, self.starts)
+    
+  @memoized_property
+  def firsts(self):
+    return self.values[self.starts]
+    
+  @memoized_property
+  def lasts(self):
+    return self.values[self.ends - 1]
+
+def sum_may_overflow(numpy, values):
+  """ True if adding up integer values could exceed their dtype. """
+  if values.dtype.kind not in 'iu':
+    return False
+  largest = max(abs(int(values.min())), abs(int(values.max())))
+  return largest * len(values) > numpy.iinfo(values.dtype).max
+
+def aggregate_columns(keys, values, **reducers):
+  """ aggregate() over two parallel columns: values[i] belongs to the group keys[i].
+  
+  When NumPy is installed, the values are integers or floats and all reducers are Count, Sum, Min, Max, First
+  or Last without a func, the groups are computed with vectorized NumPy operations; otherwise (and when
+  an integer Sum could overflow) the columns are folded item by item. Either way the result is
+  {key: {name: result}} of Python values. """
+  numpy = None
+  if all(reducer.func is None and hasattr(reducer, 'reduce_array') and
+         issubclass(defining_class(reducer, 'reduce_array'), defining_class(reducer, 'step'))
+         for reducer in reducers.itervalues()):
+    try:
+      import numpy
+    except ImportError:
+      pass
+  if numpy is not None:
+    values = numpy.asarray(values)
+    if (values.dtype.kind in 'iuf' and len(values) and
+        not (any(isinstance(reducer, Sum) for reducer in reducers.itervalues()) and sum_may_overflow(numpy, values))):
+      groups = ArrayGroups(numpy, numpy.asarray(keys), values)
+      columns = [(name, reducer.reduce_array(groups).tolist()) for name, reducer in reducers.iteritems()]
+      return dict((key, dict((name, column[i]) for name, column in columns)) for i, key in enumerate(groups.keys.tolist()))
+    keys, values = numpy.asarray(keys).tolist(), values.tolist()
+  return fold(itertools.izip(keys, values), reducers)
+
 def flatten(l, ltypes=(list, tuple)):
-  ltype = type(l)
-  l = list(l)
-  i = 0
-  while i < len(l):
-    while isinstance(l[i], ltypes):
-      if not l[i]:
-        l.pop(i)
-        i -= 1
+  """ Returns the non-list items of arbitrarily nested lists and tuples, in order, as a sequence of the type of l. """
+  result = []
+  append = result.append
+  stack = []
+  current = iter(l)
+  while True:
+    for item in current:
+      if isinstance(item, ltypes):
+        stack.append(current)
+        current = iter(item)
+        break
+      append(item)
+    else:
+      if not stack:
+        return type(l)(result)
+      current = stack.pop()
+
+def iflatten(l, ltypes=(list, tuple)):
+  """ Lazy flatten(): yields the non-list items one by one, keeping an explicit stack instead of recursing. """
+  stack = []
+  current = iter(l)
+  while True:
+    for item in current:
+      if isinstance(item, ltypes):
+        stack.append(current)
+        current = iter(item)
         break
-      else:
-        l[i:i + 1] = l[i]
-    i += 1
-  return ltype(l)
+      yield item
+    else:
+      if not stack:
+        return
+      current = stack.pop()
@@ -1,5 +1,64 @@
+import os
 import string
-from random import Random
+import threading
 
-def random_string(len = 12, chars = string.letters+string.digits):
-  return ''.join(Random().sample(chars, 12))
+ALPHANUMERIC = string.ascii_letters + string.digits
+
+# number of bytes requested from os.urandom at once
+RANDOM_BUFFER_SIZE = 4096
+
+class RandomBytes(object):
+  """ Serves bytes of os.urandom from a buffer refilled in batches. A forked child
+  discards the buffer inherited from its parent instead of repeating its bytes. """
+  
+  def __init__(self, buffer_size=RANDOM_BUFFER_SIZE):
+    self.buffer_size = buffer_size
+    self.buffer = ''
+    self.pid = None
+    self.lock = threading.Lock()
+    
+  def read(self, count):
+    with self.lock:
+      if self.pid != os.getpid() or len(self.buffer) < count:
+        self.buffer = os.urandom(max(self.buffer_size, count))
+        self.pid = os.getpid()
+      result, self.buffer = self.buffer[:count], self.buffer[count:]
+      return result
+
+RANDOM_BYTES = RandomBytes()
+
+# alphabet -> (translation table, bytes to delete, fraction of bytes kept)
+ALPHABET_TABLES = {}
+
+def alphabet_table(chars):
+  """ Maps bytes 0..limit-1 to chars[byte % len(chars)] and deletes the rest, limit being the
+  largest multiple of len(chars) up to 256, so every character is equally likely. """
+  try:
+    return ALPHABET_TABLES[chars]
+  except KeyError:
+    pass
+  if not 0 < len(chars) <= 256:
+    raise ValueError, "alphabet must have 1 to 256 characters"
+  limit = 256 - 256 % len(chars)
+  table = ''.join((chars[byte % len(chars)] if byte < limit else '\0') for byte in xrange(256))
+  deleted = ''.join(chr(byte) for byte in xrange(limit, 256))
+  result = ALPHABET_TABLES[chars] = (table, deleted, limit / 256.0)
+  return result
+
+def random_chars(count, chars=ALPHANUMERIC):
+  """ Returns count characters drawn uniformly and independently from chars using the OS CSPRNG. """
+  table, deleted, kept = alphabet_table(chars)
+  parts = []
+  while count > 0:
+    part = RANDOM_BYTES.read(int(count / kept) + 8).translate(table, deleted)[:count]
+    parts.append(part)
+    count -= len(part)
+  return ''.join(parts)
+
+def random_strings(n, len=12, chars=ALPHANUMERIC):
+  """ Returns a list of n random strings of len characters, e.g. session or CSRF tokens. """
+  text = random_chars(n * len, chars)
+  return [text[i:i + len] for i in xrange(0, n * len, len)]
+
+def random_string(len=12, chars=ALPHANUMERIC):
+  return random_chars(len, chars)
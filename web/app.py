@@ -1,3 +1,23 @@
+import sys
+import time
+import logging
+
+# (module name, seconds) for every module imported through this file, in load order
+IMPORT_TIMES = []
+
+def import_module(name):
+  if name in sys.modules:
+    return sys.modules[name]
+  start = time.time()
+  module = __import__(name, globals(), locals(), ['__name__'], 0)
+  IMPORT_TIMES.append((name, time.time() - start))
+  return module
+
+def import_report():
+  """ Returns a human-readable list of the modules imported for URL mappings and their import times. """
+  lines = ["%8.1f ms  %s" % (seconds * 1000, name) for name, seconds in IMPORT_TIMES]
+  lines.append("%8.1f ms  total, %d modules" % (sum(seconds for name, seconds in IMPORT_TIMES) * 1000, len(IMPORT_TIMES)))
+  return "\n".join(lines)
 
 def load_url_mapping(*components):
   url_mapping = []
@@ -5,6 +25,39 @@ def load_url_mapping(*components):
     if isinstance(component, (list, tuple, set)):
       url_mapping += load_url_mapping(*component)
     else:
-      module = __import__(component, globals(), locals(), ['url_mapping'], 0)
+      module = import_module(component)
       url_mapping += getattr(module, 'url_mapping')
   return url_mapping
+
+class LazyHandler(object):
+  """ Stands for a handler class given as 'package.module.ClassName' in a URL mapping;
+  imports the module when the first request is routed to it. """
+
+  def __init__(self, handler_path):
+    self.handler_path = handler_path
+    self.module_name, _, self.class_name = handler_path.rpartition('.')
+    self.handler_class = None
+
+  def resolve(self):
+    if self.handler_class is None:
+      module = import_module(self.module_name)
+      self.handler_class = getattr(module, self.class_name)
+      logging.info("Loaded %s for the first request routed to it", self.handler_path)
+    return self.handler_class
+
+  def __call__(self, *args, **kw):
+    return self.resolve()(*args, **kw)
+
+  def __repr__(self):
+    return '<LazyHandler %s>' % self.handler_path
+
+def lazy_url_mapping(*routes):
+  """ Builds a URL mapping out of (regex, 'package.module.HandlerClass') pairs without importing anything. """
+  url_mapping = []
+  for route in routes:
+    if isinstance(route, list):
+      url_mapping += lazy_url_mapping(*route)
+    else:
+      regex, handler = route
+      url_mapping.append((regex, LazyHandler(handler) if isinstance(handler, basestring) else handler))
+  return url_mapping
@@ -0,0 +1,29 @@
+""" Backends loading the entities requested by batch fetchers (see yoursway.web.handling.batch_fetcher)
+in a single round trip. A backend is any object with a get_multi(keys) method returning the entities,
+or None for missing ones, in the order of the keys. """
+
+__all__ = ['DatastoreFetchBackend', 'InMemoryFetchBackend']
+
+from yoursway.utils.sequtil import index_by_key
+from yoursway.utils.importutil import lazy_import
+
+db = lazy_import('google.appengine.ext.db')
+
+class DatastoreFetchBackend(object):
+  
+  def get_multi(self, keys):
+    return db.get(keys)
+
+class InMemoryFetchBackend(object):
+  """ A stand-in holding entities (anything with a key() method) in a dict; counts round trips. """
+  
+  def __init__(self, entities=()):
+    self.entities = index_by_key(entities)
+    self.round_trips = 0
+    
+  def put(self, entity):
+    self.entities[entity.key()] = entity
+    
+  def get_multi(self, keys):
+    self.round_trips += 1
+    return [self.entities.get(key) for key in keys]
@@ -1,237 +1,443 @@
-# 
-# from yoursway.web.utils import escape
-# from yoursway.web.validation import PostbackSession, valid_string, valid_int
-# 
-# from django.utils.safestring import mark_safe
-# from datetime import date
-# 
-# class Field(object):
-#   
-#   instance_counter = 0  # incremented on each creation to establish ordering of fields inside a class
-#   
-#   def __new__(self, *args, **kw):
-#     result = object.__new__(self, *args, **kw)
-#     result.instance_index = Field.instance_counter
-#     Field.instance_counter += 1
-#     return result
-#   
-#   def set_name(self, name):
-#     self.name = name
-#     self.derive_names()
-# 
-#   def derive_names(self):
-#     pass # override point
-#     
-#   def initialize(self, form):
-#     value = (self.default_value() if hasattr(self.default_value, '__call__') else self.default_value)
-#     setattr(form, self.name, value)
-#   
-#   def load(self, form, model):
-#     setattr(form, self.name, getattr(model, self.name))
-#   
-#   def save(self, form, model):
-#     setattr(model, self.name, getattr(form, self.name))
-# 
-# import logging
-# class FormMeta(type):
-#   def __new__(cls, name, bases, dct):
-#     new_dict = {}
-#     fields = []
-#     for k, v in dct.iteritems():
-#       if isinstance(v, Field):
-#         if hasattr(v, 'depends_on_fields'):
-#           for f in v.depends_on_fields:
-#             if f not in fields:
-#               fields.append(f)
-#         if v not in fields:
-#           fields.append(v)
-#         v.set_name(k)
-#         new_dict[k+'_field'] = v
-#       new_dict[k] = v
-#       
-#     fields.sort(lambda a, b: a.instance_index - b.instance_index)
-#       
-#     new_dict['fields'] = fields
-#     
-#     return type.__new__(cls, name, bases, new_dict)
-#     
-#   def __init__(cls, name, bases, dct):
-#     super(FormMeta, cls).__init__(name, bases, dct)
-# 
-# class Form:
-#   __metaclass__ = FormMeta
-#   
-#   def __init__(self):
-#     self.session = None
-#     for field in self.fields:
-#       field.initialize(self)
-#   
-#   def postback(self, handler):
-#     self.session = PostbackSession(handler.request)
-#     for field in self.fields:
-#       field.postback(self, self.session)
-#     return self.session
-#     
-#   @property
-#   def valid(self):
-#     return self.session.is_valid()
-#     
-#   def first_invalid(self):
-#     for field in self.fields:
-#       if not self.session.is_valid(field.name):
-#         return (field.name, self.session.messages[field.name])
-#     return self.session.messages.items()[0]
-#     
-#   def load(self, model):
-#     for field in self.fields:
-#       field.load(self, model)
-#     
-#   def save(self, model):
-#     for field in self.fields:
-#       field.save(self, model)
-# 
-# def render_tag(tag, content=None, **attrs):
-#   text = '<' + tag
-#   for k, v in attrs.iteritems():
-#     if k == 'klass': k = 'class'
-#     if v is None:  continue
-#     if v is False: continue
-#     if v is True:  v = k
-#     if isinstance(v, (list, tuple)):
-#       v = " ".join(filter(lambda x: x is not None, v))  # useful for CSS classes or styles
-#     text = text + ' ' + k + '="' + escape(v) + '"'
-#   if content or tag == 'textarea':
-#     if isinstance(content, (list, tuple)):
-#       content = "".join(content)
-#     return text + '>' + content + '</' + tag + '>'
-#   else:
-#     return text + ' />'
-# 
-# def render_option(name, value, current_value):
-#   return render_tag('option', escape(unicode(name)), value=value, selected=(value == current_value))
-# 
-# def render_select(options, value=None, name=None, **attrs):
-#   options = map(lambda option: (option if isinstance(option, dict) else dict(name=option, value=option)), options)
-#   rendered_options = map(lambda option: render_option(current_value=value, **option), options)
-#   return render_tag('select', rendered_options, id=name, name=name, **attrs)
-#   
-# class StringField(Field):
-#   
-#   def __init__(self, default_value='', required=True, klass=None, attrs={},
-#         use_none=True, min_len=None, max_len=None,
-#         required_message = "Required.",
-#         min_len_message = "Please enter at least %(min)d characters.",
-#         max_len_message = "Cannot be longer that %(max)d characters.",
-#         placeholder=None, style=None):
-#     self.default_value = default_value
-#     self.required = required
-#     self.attrs = {}
-#     self.klass = klass
-#     self.use_none = use_none
-#     self.min_len = min_len
-#     self.max_len = max_len
-#     self.min_len_message = min_len_message
-#     self.max_len_message = max_len_message
-#     self.required_message = required_message
-#     self.attrs['placeholder'] = placeholder
-#     self.attrs['style'] = style
-#     
-#   def render(self, form, params):
-#     value = getattr(form, self.name, None) or ''
-#     return render_tag('input', id=self.name, name=self.name, type='text', klass=[self.klass, params.get('klass')], value=value, **self.attrs)
-#     
-#   def postback(self, form, session):
-#      setattr(form, self.name, valid_string(session, self.name, required=self.required, use_none=self.use_none,
-#       min_len=self.min_len, max_len=self.max_len,
-#       min_len_message=self.min_len_message, max_len_message=self.max_len_message,
-#       required_message=self.required_message))
-#   
-# class TextField(Field):
-#   
-#   def __init__(self, default_value='', required=True, klass=None, attrs={},
-#         use_none=True, min_len=None, max_len=None,
-#         required_message = "Required.",
-#         min_len_message = "Please enter at least %(min)d characters.",
-#         max_len_message = "Cannot be longer that %(max)d characters.",
-#         placeholder=None, style=None, rows=3):
-#     self.default_value = default_value
-#     self.required = required
-#     self.attrs = {}
-#     self.klass = klass
-#     self.use_none = use_none
-#     self.min_len = min_len
-#     self.max_len = max_len
-#     self.min_len_message = min_len_message
-#     self.max_len_message = max_len_message
-#     self.required_message = required_message
-#     self.attrs['placeholder'] = placeholder
-#     self.attrs['style'] = style
-#     self.rows = rows
-#     
-#   def render(self, form, params):
-#     value = getattr(form, self.name, None) or ''
-#     return render_tag('textarea', value, id=self.name, name=self.name, type='text', klass=[self.klass, params.get('klass')], rows=self.rows, **self.attrs)
-#     
-#   def postback(self, form, session):
-#      setattr(form, self.name, valid_string(session, self.name, required=self.required, use_none=self.use_none,
-#       min_len=self.min_len, max_len=self.max_len,
-#       min_len_message=self.min_len_message, max_len_message=self.max_len_message,
-#       required_message=self.required_message))
-# 
-# class DateField(Field):
-#   
-#   MONTH_FULL = '%B'
-#   MONTH_ABBREV = '%b'
-#   MONTH_ORDINAL_AND_FULL = '%m - %B'
-#   
-#   def __init__(self, default_value=(lambda: date.today()), reference_date=None, past=True, future=True, past_years=10, future_years=10,
-#                order=('month', 'day', 'year'), month_format='%B', day_with_zeros=True,
-#                no_such_day_message='No such day in %B %Y', klass=None):
-#     self.default_value = default_value
-#     self.past = past
-#     self.future = future
-#     self.past_years = past_years
-#     self.future_years = future_years
-#     self.order = order
-#     self.month_format = month_format
-#     self.day_format = ('%02d' if day_with_zeros else '%d')
-#     self.reference_date = (reference_date or date.today())
-#     self.no_such_day_message = no_such_day_message
-#     self.klass = klass
-#     
-#     self.min_year = (self.reference_date.year-self.past_years if self.past else self.reference_date.year)
-#     self.max_year = (self.reference_date.year+self.future_years if self.future else self.reference_date.year)
-#   
-#   def derive_names(self):
-#     self.year_name, self.month_name, self.day_name = self.name+'_year', self.name+'_month', self.name+'_day'
-#   
-#   def render(self, form, params):
-#     value = getattr(form, self.name)
-#     
-#     years  = range(self.min_year, self.max_year+1)
-#     months = (dict(value=m, name=date(2000, m, 1).strftime(self.month_format)) for m in range(1,13))
-#     days   = (dict(value=d, name=self.day_format % d) for d in range(1,32))
-#     
-#     year, month, day = ((value.year,value.month,value.day) if value else (-1,-1,-1))
-#     year_select  = render_select(years,  name=self.year_name,  value=year,  klass=[self.klass, 'year-select', params.get('klass')])
-#     month_select = render_select(months, name=self.month_name, value=month, klass=[self.klass, 'month-select', params.get('klass')])
-#     day_select   = render_select(days,   name=self.day_name,   value=day,   klass=[self.klass, 'day-select', params.get('klass')])
-#     
-#     components = dict(year=year_select, month=month_select, day=day_select)
-#     ordered = map(lambda c: components[c], self.order)
-#     return "".join(ordered)
-#     
-#   def postback(self, form, session):
-#     year  = valid_int(session, self.year_name,  min_value=self.min_year, max_value=self.max_year, missing_value=-1)
-#     month = valid_int(session, self.month_name, min_value=1, max_value=12, missing_value=-1)
-#     day   = valid_int(session, self.day_name,   min_value=1, max_value=31, missing_value=-1)
-#     if year is None or month is None or day is None:
-#       value = None
-#     else:
-#       try:
-#         value = date(year, month, day)
-#       except ValueError:
-#         session.invalid(self.day_name, date(year, month, 1).strftime(no_such_day_message))
-#         value = None
-#     setattr(form, self.name, value)
-#   
+from yoursway.web.utils import escape, escape_attr, mark_escaped
+from yoursway.web.validation import PostbackSession, StringValidator, IntValidator, valid_string, valid_int
+from yoursway.web.forms.compiler import FormCompiler
+from yoursway.utils.cacheutil import LRUCache
+
+from datetime import date
+
+# set to False before form classes are defined to debug fields through the interpreted
+# Form.postback/load/save/render_all instead of the methods generated by FormMeta
+COMPILE_FORMS = True
+
+class Field(object):
+  
+  instance_counter = 0  # incremented on each creation to establish ordering of fields inside a class
+  
+  def __new__(self, *args, **kw):
+    result = object.__new__(self)
+    result.instance_index = Field.instance_counter
+    Field.instance_counter += 1
+    return result
+  
+  def set_name(self, name):
+    self.name = name
+    self.derive_names()
+
+  def derive_names(self):
+    pass # override point
+    
+  def initialize(self, form):
+    value = (self.default_value() if hasattr(self.default_value, '__call__') else self.default_value)
+    setattr(form, self.name, value)
+  
+  def load(self, form, model):
+    setattr(form, self.name, getattr(model, self.name))
+  
+  def save(self, form, model):
+    setattr(model, self.name, getattr(form, self.name))
+    
+  # subclasses override render or emit (or both)
+  def render(self, form, params):
+    parts = []
+    self.emit(form, params, parts.append)
+    return ''.join(parts)
+    
+  def emit(self, form, params, write):
+    if type(self).render.im_func is Field.render.im_func:
+      raise NotImplementedError, "%s must override render or emit" % type(self).__name__
+    write(self.render(form, params))
+    
+  def compile_load(self, c):
+    c.emit('self.%s = model.%s' % (self.name, self.name))
+    
+  def compile_save(self, c):
+    c.emit('model.%s = self.%s' % (self.name, self.name))
+
+def replaceable_form_method(klass, method_name):
+  """ True if the nearest definition of the method is Form's interpreted one or a compiled one,
+  i.e. not written by hand in the class or one of its bases. """
+  if method_name in klass.__dict__:
+    return False
+  for base in klass.__mro__[1:]:
+    if method_name in base.__dict__:
+      return base is Form or getattr(base.__dict__[method_name], 'compiled_form_method', False)
+  return False
+
+class FormMeta(type):
+  def __new__(cls, name, bases, dct):
+    new_dict = {}
+    fields = []
+    for k, v in dct.iteritems():
+      if isinstance(v, Field):
+        if hasattr(v, 'depends_on_fields'):
+          for f in v.depends_on_fields:
+            if f not in fields:
+              fields.append(f)
+        if v not in fields:
+          fields.append(v)
+        v.set_name(k)
+        new_dict[k+'_field'] = v
+      new_dict[k] = v
+      
+    fields.sort(lambda a, b: a.instance_index - b.instance_index)
+      
+    new_dict['fields'] = fields
+    
+    klass = type.__new__(cls, name, bases, new_dict)
+    if COMPILE_FORMS and klass.compiled:
+      methods, klass.compiled_source = FormCompiler(fields, globals()).compile()
+      for method_name, method in methods.iteritems():
+        if replaceable_form_method(klass, method_name):
+          setattr(klass, method_name, method)
+    return klass
+    
+  def __init__(cls, name, bases, dct):
+    super(FormMeta, cls).__init__(name, bases, dct)
+
+class Form:
+  __metaclass__ = FormMeta
+  
+  compiled = True  # set to False in a form class to keep the interpreted methods below
+  
+  def __init__(self):
+    self.session = None
+    for field in self.fields:
+      field.initialize(self)
+  
+  def postback(self, handler):
+    self.session = PostbackSession(handler.request)
+    for field in self.fields:
+      field.postback(self, self.session)
+    return self.session
+    
+  @property
+  def valid(self):
+    return self.session.is_valid()
+    
+  def first_invalid(self):
+    for field in self.fields:
+      if not self.session.is_valid(field.name):
+        return (field.name, self.session.messages[field.name])
+    return self.session.messages.items()[0]
+    
+  def load(self, model):
+    for field in self.fields:
+      field.load(self, model)
+    
+  def save(self, model):
+    for field in self.fields:
+      field.save(self, model)
+      
+  def render_all(self, params={}):
+    return [(field.name, field.render(self, params)) for field in self.fields]
+
+def emit_attrs(write, attrs):
+  for k, v in attrs.iteritems():
+    if k == 'klass': k = 'class'
+    if v is None:  continue
+    if v is False: continue
+    if v is True:  v = k
+    if isinstance(v, (list, tuple)):
+      v = " ".join(filter(lambda x: x is not None, v))  # useful for CSS classes or styles
+    write(' ' + k + '="' + escape_attr(v) + '"')
+
+def emit_tag(write, tag, content=None, **attrs):
+  """ Writes the markup render_tag would return through the given write function, piece by piece. """
+  emit_tag_with_attrs(write, tag, content, attrs)
+
+def emit_tag_with_attrs(write, tag, content, attrs):
+  write('<' + tag)
+  emit_attrs(write, attrs)
+  if content or tag == 'textarea':
+    write('>')
+    if isinstance(content, (list, tuple)):
+      for item in content:
+        write(item)
+    elif content is not None:
+      write(content)
+    write('</' + tag + '>')
+  else:
+    write(' />')
+
+def render_tag(tag, content=None, **attrs):
+  parts = []
+  emit_tag_with_attrs(parts.append, tag, content, attrs)
+  return mark_escaped(''.join(parts))
+
+class HtmlBuilder(object):
+  """ Streams markup into a list, or straight into a file-like object such as handler.response.out:
+  
+    html = HtmlBuilder(handler.response.out)
+    html.start('form', method='post', action='')
+    html.field(form, 'title', klass='wide')
+    html.end('form')
+  """
+  
+  def __init__(self, out=None):
+    if out is None:
+      self.parts = []
+      self.write = self.parts.append
+    else:
+      self.parts = None
+      self.write = out.write
+      
+  def tag(self, tag, content=None, **attrs):
+    emit_tag_with_attrs(self.write, tag, content, attrs)
+    return self
+    
+  def start(self, tag, **attrs):
+    self.write('<' + tag)
+    emit_attrs(self.write, attrs)
+    self.write('>')
+    return self
+    
+  def end(self, tag):
+    self.write('</' + tag + '>')
+    return self
+    
+  def text(self, text):
+    self.write(escape(text))
+    return self
+    
+  def raw(self, html):
+    self.write(html)
+    return self
+    
+  def field(self, form, name, **params):
+    getattr(form, name + '_field').emit(form, params, self.write)
+    return self
+    
+  def getvalue(self):
+    return mark_escaped(''.join(self.parts))
+
+def render_option(name, value, current_value):
+  return render_tag('option', escape(unicode(name)), value=value, selected=(value == current_value))
+
+def normalize_options(options):
+  return map(lambda option: (option if isinstance(option, dict) else dict(name=option, value=option)), options)
+
+def render_select(options, value=None, name=None, **attrs):
+  rendered_options = map(lambda option: render_option(current_value=value, **option), normalize_options(options))
+  return render_tag('select', rendered_options, id=name, name=name, **attrs)
+
+class NotAnOption(object):
+  """ Never equal to any option value. """
+
+class OptionsFragment(object):
+  """ Pre-rendered <option> list of a select; render(value) splices in the selected
+  variant of the matching options instead of rendering all options again. """
+  
+  def __init__(self, options):
+    nothing = NotAnOption()
+    parts = []
+    self.selections = {}
+    self.values = []
+    offset = 0
+    for option in normalize_options(options):
+      html = render_option(current_value=nothing, **option)
+      selection = (offset, offset + len(html), render_option(current_value=option['value'], **option))
+      self.values.append((option['value'], selection))
+      try:
+        self.selections.setdefault(option['value'], []).append(selection)
+      except TypeError:
+        pass  # unhashable value, only found by the linear scan in render
+      parts.append(html)
+      offset += len(html)
+    self.html = u''.join(parts)
+    
+  def render(self, value):
+    try:
+      selections = self.selections.get(value)
+    except TypeError:
+      selections = [selection for option_value, selection in self.values if option_value == value]
+    if not selections:
+      return self.html
+    html = self.html
+    pieces, last = [], 0
+    for start, end, selected_html in selections:
+      pieces.append(html[last:start])
+      pieces.append(selected_html)
+      last = end
+    pieces.append(html[last:])
+    return u''.join(pieces)
+
+# configuration key -> OptionsFragment
+OPTIONS_FRAGMENTS = LRUCache(128)
+
+def options_fragment(key, options_factory):
+  """ Returns the OptionsFragment cached under key, building it out of options_factory() if needed.
+  The key must capture everything the options depend on. """
+  fragment = OPTIONS_FRAGMENTS.get(key)
+  if fragment is None:
+    fragment = OptionsFragment(options_factory())
+    OPTIONS_FRAGMENTS.set(key, fragment)
+  return fragment
+
+def render_cached_select(key, options_factory, value=None, name=None, **attrs):
+  """ Same markup as render_select(options_factory(), ...), with the options rendered once per key. """
+  return render_tag('select', options_fragment(key, options_factory).render(value), id=name, name=name, **attrs)
+
+def emit_cached_select(write, key, options_factory, value=None, name=None, **attrs):
+  emit_tag(write, 'select', options_fragment(key, options_factory).render(value), id=name, name=name, **attrs)
+  
+class StringField(Field):
+  
+  def __init__(self, default_value='', required=True, klass=None, attrs={},
+        use_none=True, min_len=None, max_len=None,
+        required_message = "Required.",
+        min_len_message = "Please enter at least %(min)d characters.",
+        max_len_message = "Cannot be longer that %(max)d characters.",
+        placeholder=None, style=None):
+    self.default_value = default_value
+    self.required = required
+    self.attrs = {}
+    self.klass = klass
+    self.use_none = use_none
+    self.min_len = min_len
+    self.max_len = max_len
+    self.min_len_message = min_len_message
+    self.max_len_message = max_len_message
+    self.required_message = required_message
+    self.attrs['placeholder'] = placeholder
+    self.attrs['style'] = style
+    
+  def emit(self, form, params, write):
+    value = getattr(form, self.name, None) or ''
+    emit_tag(write, 'input', id=self.name, name=self.name, type='text', klass=[self.klass, params.get('klass')], value=value, **self.attrs)
+    
+  def postback(self, form, session):
+     setattr(form, self.name, valid_string(session, self.name, required=self.required, use_none=self.use_none,
+      min_len=self.min_len, max_len=self.max_len,
+      min_len_message=self.min_len_message, max_len_message=self.max_len_message,
+      required_message=self.required_message))
+      
+  def compile_render(self, c):
+    c.emit("append((%r, render_tag('input', id=%r, name=%r, type='text', klass=[%s, params.get('klass')], value=(getattr(self, %r, None) or ''), **%s)))" % (
+      self.name, self.name, self.name, c.const(self.klass), self.name, c.const(self.attrs)))
+      
+  def compile_postback(self, c):
+    compile_string_postback(self, c)
+  
+class TextField(Field):
+  
+  def __init__(self, default_value='', required=True, klass=None, attrs={},
+        use_none=True, min_len=None, max_len=None,
+        required_message = "Required.",
+        min_len_message = "Please enter at least %(min)d characters.",
+        max_len_message = "Cannot be longer that %(max)d characters.",
+        placeholder=None, style=None, rows=3):
+    self.default_value = default_value
+    self.required = required
+    self.attrs = {}
+    self.klass = klass
+    self.use_none = use_none
+    self.min_len = min_len
+    self.max_len = max_len
+    self.min_len_message = min_len_message
+    self.max_len_message = max_len_message
+    self.required_message = required_message
+    self.attrs['placeholder'] = placeholder
+    self.attrs['style'] = style
+    self.rows = rows
+    
+  def emit(self, form, params, write):
+    value = getattr(form, self.name, None) or ''
+    emit_tag(write, 'textarea', value, id=self.name, name=self.name, type='text', klass=[self.klass, params.get('klass')], rows=self.rows, **self.attrs)
+    
+  def postback(self, form, session):
+     setattr(form, self.name, valid_string(session, self.name, required=self.required, use_none=self.use_none,
+      min_len=self.min_len, max_len=self.max_len,
+      min_len_message=self.min_len_message, max_len_message=self.max_len_message,
+      required_message=self.required_message))
+      
+  def compile_render(self, c):
+    c.emit("append((%r, render_tag('textarea', (getattr(self, %r, None) or ''), id=%r, name=%r, type='text', klass=[%s, params.get('klass')], rows=%s, **%s)))" % (
+      self.name, self.name, self.name, self.name, c.const(self.klass), c.const(self.rows), c.const(self.attrs)))
+      
+  def compile_postback(self, c):
+    compile_string_postback(self, c)
+    
+def compile_string_postback(field, c):
+  validator = StringValidator(required=field.required, use_none=field.use_none,
+    min_len=field.min_len, max_len=field.max_len,
+    min_len_message=field.min_len_message, max_len_message=field.max_len_message,
+    required_message=field.required_message)
+  c.emit('self.%s = %s(session, %r)' % (field.name, c.const(validator), field.name))
+
+class DateField(Field):
+  
+  MONTH_FULL = '%B'
+  MONTH_ABBREV = '%b'
+  MONTH_ORDINAL_AND_FULL = '%m - %B'
+  
+  def __init__(self, default_value=(lambda: date.today()), reference_date=None, past=True, future=True, past_years=10, future_years=10,
+               order=('month', 'day', 'year'), month_format='%B', day_with_zeros=True,
+               no_such_day_message='No such day in %B %Y', klass=None):
+    self.default_value = default_value
+    self.past = past
+    self.future = future
+    self.past_years = past_years
+    self.future_years = future_years
+    self.order = order
+    self.month_format = month_format
+    self.day_format = ('%02d' if day_with_zeros else '%d')
+    self.reference_date = (reference_date or date.today())
+    self.no_such_day_message = no_such_day_message
+    self.klass = klass
+    
+    self.min_year = (self.reference_date.year-self.past_years if self.past else self.reference_date.year)
+    self.max_year = (self.reference_date.year+self.future_years if self.future else self.reference_date.year)
+  
+  def derive_names(self):
+    self.year_name, self.month_name, self.day_name = self.name+'_year', self.name+'_month', self.name+'_day'
+  
+  def emit(self, form, params, write):
+    value = getattr(form, self.name)
+    
+    years  = lambda: range(self.min_year, self.max_year+1)
+    months = lambda: (dict(value=m, name=date(2000, m, 1).strftime(self.month_format)) for m in range(1,13))
+    days   = lambda: (dict(value=d, name=self.day_format % d) for d in range(1,32))
+    
+    year, month, day = ((value.year,value.month,value.day) if value else (-1,-1,-1))
+    components = dict(
+      year  = (('years', self.min_year, self.max_year), years, self.year_name, year, 'year-select'),
+      month = (('months', self.month_format), months, self.month_name, month, 'month-select'),
+      day   = (('days', self.day_format), days, self.day_name, day, 'day-select'))
+    for component in self.order:
+      key, options, name, current, klass = components[component]
+      emit_cached_select(write, key, options, name=name, value=current, klass=[self.klass, klass, params.get('klass')])
+    
+  def postback(self, form, session):
+    year  = valid_int(session, self.year_name,  min_value=self.min_year, max_value=self.max_year, missing_value=-1)
+    month = valid_int(session, self.month_name, min_value=1, max_value=12, missing_value=-1)
+    day   = valid_int(session, self.day_name,   min_value=1, max_value=31, missing_value=-1)
+    if year is None or month is None or day is None:
+      value = None
+    else:
+      try:
+        value = date(year, month, day)
+      except ValueError:
+        session.invalid(self.day_name, date(year, month, 1).strftime(self.no_such_day_message))
+        value = None
+    setattr(form, self.name, value)
+    
+  def compile_postback(self, c):
+    year, month, day = c.var(self, 'year'), c.var(self, 'month'), c.var(self, 'day')
+    c.emit('''
+      %(year)s  = %(valid_year)s(session, %(year_name)r)
+      %(month)s = %(valid_month)s(session, %(month_name)r)
+      %(day)s   = %(valid_day)s(session, %(day_name)r)
+      if %(year)s is None or %(month)s is None or %(day)s is None:
+        self.%(name)s = None
+      else:
+        try:
+          self.%(name)s = date(%(year)s, %(month)s, %(day)s)
+        except ValueError:
+          session.invalid(%(day_name)r, date(%(year)s, %(month)s, 1).strftime(%(message)s))
+          self.%(name)s = None
+    ''' % dict(year=year, month=month, day=day, name=self.name, year_name=self.year_name, month_name=self.month_name,
+                day_name=self.day_name, message=c.const(self.no_such_day_message),
+                valid_year=c.const(IntValidator(min_value=self.min_year, max_value=self.max_year, missing_value=-1)),
+                valid_month=c.const(IntValidator(min_value=1, max_value=12, missing_value=-1)),
+                valid_day=c.const(IntValidator(min_value=1, max_value=31, missing_value=-1))))
+  
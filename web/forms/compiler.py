@@ -0,0 +1,97 @@
+""" Generates straight-line postback/load/save/render_all methods for Form classes.
+
+Each field contributes source code through its compile_<method>(compiler) hook
+(compile_postback, compile_load, compile_save, compile_render);
+fields without a hook that is at least as specific as the methods it replaces
+get a plain call to the method, so custom fields keep working unchanged. """
+
+__all__ = ['FormCompiler']
+
+import textwrap
+
+LITERAL_TYPES = (type(None), bool, int, long, float, str, unicode)
+
+# field methods whose overrides a compile_<method> hook must be aware of
+REPLACED_METHODS = {
+  'render': ('render', 'emit'),
+}
+
+# (form method, field method, arguments, prologue, epilogue)
+FORM_METHODS = (
+  ('postback',   'postback', 'self, handler',   'session = self.session = PostbackSession(handler.request)', 'return session'),
+  ('load',       'load',     'self, model',     None, None),
+  ('save',       'save',     'self, model',     None, None),
+  ('render_all', 'render',   'self, params={}', 'result = []\nappend = result.append', 'return result'),
+)
+
+def defining_class(obj, name):
+  for klass in type(obj).__mro__:
+    if name in klass.__dict__:
+      return klass
+
+class FormCompiler(object):
+
+  def __init__(self, fields, namespace):
+    self.fields = fields
+    self.namespace = dict(namespace)
+    self.lines = []
+    self.counter = 0
+
+  def const(self, value):
+    """ Returns a source expression evaluating to the given value. """
+    if isinstance(value, LITERAL_TYPES):
+      return repr(value)
+    name = '_c%d' % self.counter
+    self.counter += 1
+    self.namespace[name] = value
+    return name
+
+  def var(self, field, suffix):
+    """ Returns a local variable name unique to the given field. """
+    return '_%s_%s' % (field.name, suffix)
+
+  def emit(self, code):
+    for line in textwrap.dedent(code).strip('\n').split('\n'):
+      self.lines.append('  ' + line)
+
+  def compile_method(self, name, field_method, args, prologue, epilogue):
+    self.lines = ['def %s(%s):' % (name, args)]
+    if prologue:
+      self.emit(prologue)
+    hook = 'compile_' + field_method
+    replaced = REPLACED_METHODS.get(field_method, (field_method,))
+    for field in self.fields:
+      hook_class = defining_class(field, hook)
+      if hook_class is not None and all(klass is None or issubclass(hook_class, klass)
+                                        for klass in [defining_class(field, method) for method in replaced]):
+        getattr(field, hook)(self)
+      else:
+        getattr(self, 'call_' + field_method)(field)
+    if epilogue:
+      self.emit(epilogue)
+    elif len(self.lines) == 1:
+      self.emit('pass')
+    return '\n'.join(self.lines)
+
+  def call_postback(self, field):
+    self.emit('%s.postback(self, session)' % self.const(field))
+
+  def call_load(self, field):
+    self.emit('%s.load(self, model)' % self.const(field))
+
+  def call_save(self, field):
+    self.emit('%s.save(self, model)' % self.const(field))
+
+  def call_render(self, field):
+    self.emit('append((%r, %s.render(self, params)))' % (field.name, self.const(field)))
+
+  def compile(self):
+    """ Returns ({method name: function}, generated source). """
+    sources = [self.compile_method(*spec) for spec in FORM_METHODS]
+    source = '\n\n'.join(sources) + '\n'
+    namespace = self.namespace
+    exec compile(source, '<compiled form>', 'exec') in namespace
+    methods = dict((spec[0], namespace[spec[0]]) for spec in FORM_METHODS)
+    for method in methods.itervalues():
+      method.compiled_form_method = True
+    return methods, source
@@ -1,9 +1,14 @@
 
+import logging
+
 from django import template as templ
 from django.utils.safestring import mark_safe
 
 register = templ.Library()
 
+# log every token the field tag scans while compiling templates
+TRACE_PARSING = False
+
 @register.tag(name='field')
 def parse_field_tag(parser, token):
   bits = token.contents.split()
@@ -16,13 +21,22 @@ def parse_field_tag(parser, token):
   form_expr, field_name = expr.rsplit('.', 1)
   form_expr = parser.compile_filter(form_expr)
   
-  import logging
+  params = parse_params(parser, token)
+
+  if cell_name == '': cell_name = None
+  
+  return PythonFieldNode(form_expr, field_name, cell_name, params)
+
+def parse_params(parser, token):
+  """ Consumes {% param name value %} and {% param name %}...{% endparam %} tags following the given one. """
   params = []
   try:
-    logging.info("parsing " + token.contents)
+    if TRACE_PARSING:
+      logging.debug("parsing " + token.contents)
     while parser.tokens:
       token = parser.next_token()
-      logging.info(repr(token.__dict__))
+      if TRACE_PARSING:
+        logging.debug(repr(token.__dict__))
       bits = token.contents.split(None, 2)
       
       if token.token_type == 0 and len(bits) == 0:
@@ -43,12 +57,26 @@ def parse_field_tag(parser, token):
         break
     
   except Exception, e:
-    import logging
     logging.error(str(e))
+  return params
 
+@register.tag(name='fields')
+@register.tag(name='form')
+def parse_fields_tag(parser, token):
+  """ {% fields [form_expr [cell_name]] %} renders every field of a form, exactly like a
+  {% field %} tag with the same cell and params would for each of them (except that
+  stateful tags like {% cycle %} inside a param are shared by all fields). """
+  bits = token.contents.split()
+  
+  tag_name  = bits.pop(0)
+  form_expr = parser.compile_filter(bits.pop(0) if len(bits) > 0 else 'form')
+  cell_name = (bits.pop(0) if len(bits) > 0 else None)
+  
+  params = parse_params(parser, token)
+  
   if cell_name == '': cell_name = None
   
-  return PythonFieldNode(form_expr, field_name, cell_name, params)
+  return PythonFieldsNode(form_expr, cell_name, params)
 
 class PythonFieldNode(templ.Node):
   def __init__(self, form_expr, field_name, cell_name, params):
@@ -93,11 +121,71 @@ class PythonFieldNode(templ.Node):
     finally:
       context.pop()
 
+class PythonFieldsNode(templ.Node):
+  def __init__(self, form_expr, cell_name, params):
+    self.form_expr = form_expr
+    self.cell_name = cell_name
+    self.params    = params
+    # params made only of text and variables render the same for every field
+    self.static_params = all(value_nodelist is None or all(isinstance(node, (templ.TextNode, templ.VariableNode)) for node in value_nodelist)
+                             for var_name, value, value_nodelist in self.params)
+
+  def render_params(self, context):
+    param_values = {}
+    for var_name, value, value_nodelist in self.params:
+      if value_nodelist:
+        value = value_nodelist.render(context)
+      context[var_name] = mark_safe(value)
+      param_values[var_name] = value
+    return param_values
+
+  def render(self, context):
+    form = self.form_expr.resolve(context)
+    messages = (form.session.messages if form.session else {})
+    cell = None
+    if self.cell_name:
+      cell = context.get('%s_cell' % self.cell_name)
+      if cell is None:
+        return u"(! cell %s is missing !)" % self.cell_name * len(form.fields)
+    
+    result = []
+    static_values = None
+    for field in form.fields:
+      # a fresh frame per field, so params set for one field never leak into the next
+      context.push()
+      try:
+        if static_values is None:
+          param_values = self.render_params(context)
+          if self.static_params:
+            static_values = param_values
+        else:
+          for var_name, value in static_values.iteritems():
+            context[var_name] = mark_safe(value)
+        
+        rendered = mark_safe(field.render(form, param_values))
+        if cell is None:
+          result.append(rendered)
+          continue
+        
+        error = messages.get(field.name)
+        context.push()
+        try:
+          context['f'] = field.name
+          context['v'] = rendered
+          context['ec'] = ('error' if error else '')
+          context['e'] = (error or '')
+          result.append(cell.render_cell(context))
+        finally:
+          context.pop()
+      finally:
+        context.pop()
+    return mark_safe(u''.join(result))
+
 @register.tag(name='defcell')
 def parse_defcell_tag(parser, token):
   bits = token.contents.split()
   if len(bits) != 2:
-    raise TemplateSyntaxError, "'%s' tag takes only one argument" % bits[0]
+    raise templ.TemplateSyntaxError, "'%s' tag takes only one argument" % bits[0]
   cell_name = bits[1]
   nodelist = parser.parse(('endcell', 'endcell %s' % cell_name))
   parser.delete_first_token()
@@ -119,7 +207,7 @@ class CellNode(templ.Node):
 def parse_default_tag(parser, token):
   bits = token.contents.split()
   if len(bits) != 2:
-    raise TemplateSyntaxError, "'%s' tag takes only one argument" % bits[0]
+    raise templ.TemplateSyntaxError, "'%s' tag takes only one argument" % bits[0]
   var_name = bits[1]
   nodelist = parser.parse(('enddefault',))
   parser.delete_first_token()
@@ -1,11 +1,19 @@
 
-__all__ = ('fetcher', 'provider', 'StopRequest', 'YSHandler', 'can_redirect')
+__all__ = ('fetcher', 'batch_fetcher', 'independent', 'StopRequest', 'YSHandler', 'can_redirect')
 
 import functools
 import re
+import sys
 import logging
-from decorator import decorator
-from yoursway.utils.funcutil import non_sig_preserving_decorator
+import threading
+from yoursway.utils.importutil import lazy_import
+from yoursway.utils.funcutil import non_sig_preserving_decorator, memoized_property
+from yoursway.web.negotiation import FORMATS, recognize_format, can_redirect, build_format_methods
+from yoursway.web.instrumentation import clock
+from yoursway.web.requestcontext import RequestContext, request_context_of
+from yoursway.web.fetching import DatastoreFetchBackend
+
+decorator = lazy_import('decorator')
 
 def fetcher(fetch_func):
   """ Decorates a two-argument function: func(self, path_element). """
@@ -20,8 +28,46 @@ def fetcher(fetch_func):
     fetch_func(self, arg)
     return func(self, *args)
   fetch_decorator._autodecorate_request = True
+  fetch_decorator._request_stage = ('fetch', fetch_func)
   return fetch_decorator
 
+def batch_fetcher(attr, required=True):
+  """ Decorates a two-argument function: func(self, path_element) -> key. The entity with that key
+  is stored as self.<attr>; NotFound is raised for a missing entity unless required is False.
+  
+  Consecutive batch fetchers of a handler load their entities together through a single
+  self.fetch_backend.get_multi call, so a key function must not need the entity of another
+  fetcher in the same run. """
+  def batch_fetcher_decorator(key_func):
+    fetches = ((attr, key_func, required),)
+    @functools.wraps(key_func)
+    @non_sig_preserving_decorator
+    def fetch_decorator(func, self, *args):
+      if hasattr(args[0], '__call__'):
+        # support for dispatch_request method
+        arg, args = args[1], args[0:1] + args[2:]
+      else:
+        arg, args = args[0], args[1:]
+      run_batch_fetches(fetches, self, arg)
+      return func(self, *args)
+    fetch_decorator._autodecorate_request = True
+    fetch_decorator._request_stage = ('batch_fetch', fetches[0])
+    return fetch_decorator
+  return batch_fetcher_decorator
+
+def run_batch_fetches(fetches, handler, *path_elements):
+  if len(path_elements) != len(fetches):
+    raise IndexError, "%d batch fetchers got %d path elements" % (len(fetches), len(path_elements))
+  keys = [key_func(handler, element) for (attr, key_func, required), element in zip(fetches, path_elements)]
+  unique_keys = list(set(keys))
+  # get_multi answers in the order of the keys; entity.key() could differ from an encoded key string
+  entities = dict(zip(unique_keys, handler.fetch_backend.get_multi(unique_keys)))
+  for (attr, key_func, required), key in zip(fetches, keys):
+    entity = entities.get(key)
+    if entity is None and required:
+      raise NotFound
+    setattr(handler, attr, entity)
+
 def before_request(fetch_func):
   """ Decorates a one-argument function: func(self). """
   @functools.wraps(fetch_func)
@@ -30,6 +76,7 @@ def before_request(fetch_func):
     fetch_func(self)
     return func(self, *args)
   fetch_decorator._autodecorate_request = True
+  fetch_decorator._request_stage = ('before', fetch_func)
   return fetch_decorator
   
 def access_check(check_func):
@@ -37,18 +84,43 @@ def access_check(check_func):
   @functools.wraps(check_func)
   @non_sig_preserving_decorator
   def check_decorator(func, handler, *args, **kw):
-    try:
-      check_func(handler)
-    except AccessDenied, e:
-      from google.appengine.api import users
-      if users.get_current_user() is None and can_redirect(handler.request):
-        raise Redirect(users.create_login_url(handler.request.uri))
-      else:
-        raise e
+    run_access_check(check_func, handler)
     return func(handler, *args, **kw)
   check_decorator._autodecorate_request = True
+  check_decorator._request_stage = ('check', check_func)
   return check_decorator
 
+def independent(request_decorator):
+  """ Marks a fetcher, before_request or access_check decorator as not depending on the stages around it:
+  consecutive independent stages of a handler run concurrently. Whatever they raise propagates as if they
+  had run one after another, i.e. the exception of the first failing stage wins.
+  
+  The stages run on threads started and joined within the request, so on App Engine they share its
+  environment and may make datastore, urlfetch and users calls. Batch fetchers already load their
+  entities together and cannot be marked independent. """
+  stage = getattr(request_decorator, '_request_stage', None)
+  if stage is not None and stage[0] == 'batch_fetch':
+    raise TypeError, "batch fetcher %s cannot be independent" % stage[1][1].__name__
+  request_decorator._independent = True
+  return request_decorator
+
+def login_redirect(handler):
+  """ Returns the Redirect to the login page an AccessDenied of an access check turns into, or None. """
+  context = request_context_of(handler)
+  if context.current_user is None and context.can_redirect:
+    return Redirect(context.login_url())
+  return None
+
+def run_access_check(check_func, handler):
+  try:
+    check_func(handler)
+  except AccessDenied, e:
+    redirect = login_redirect(handler)
+    if redirect is not None:
+      raise redirect
+    else:
+      raise e
+
 class StopRequest(Exception):
   pass
   
@@ -66,8 +138,7 @@ class Redirect(Exception):
   def __init__(self, location):
     self.location = location
   
-@decorator
-def with_stop_request_support(func, handler, *args, **kw):
+def call_with_stop_request_support(func, handler, *args, **kw):
   try:
     func(handler, *args, **kw)
   except Redirect, redirect:
@@ -75,16 +146,270 @@ def with_stop_request_support(func, handler, *args, **kw):
   except StopRequest:
     pass
   
-@decorator
-def with_request_decoration_support(func, self, *args, **kw):
+def call_with_request_decoration(func, self, *args, **kw):
   self.dispatch_request(func, *args, **kw)
   
+# signature-preserving decorators, built on the decorator package only when used
+def with_stop_request_support(func):
+  return decorator.decorator(call_with_stop_request_support, func)
+  
+def with_request_decoration_support(func):
+  return decorator.decorator(call_with_request_decoration, func)
+  
+def request_method(func):
+  """ Wraps a get/post/head method: runs it through dispatch_request, handles Redirect and StopRequest. """
+  @functools.wraps(func)
+  def request_method_wrapper(self, *args, **kw):
+    try:
+      self.dispatch_request(func, *args, **kw)
+    except Redirect, redirect:
+      self.redirect(redirect.location)
+    except StopRequest:
+      pass
+  return request_method_wrapper
+
+def get_method(func):
+  """ Wraps a get method like request_method, answering from self.response_cache when the class declares one
+  (see yoursway.web.responsecache). Fetchers and access checks always run; a cache hit, or a 304 for it,
+  only replaces the handler method itself. """
+  @functools.wraps(func)
+  def cached_get(self, *args, **kw):
+    cache = self.response_cache
+    entry = cache.lookup(self)
+    if entry is not None:
+      cache.serve(self, entry)
+      raise StopRequest
+    func(self, *args, **kw)
+    cache.store_response(self)
+    
+  @functools.wraps(func)
+  def get_method_wrapper(self, *args, **kw):
+    try:
+      self.dispatch_request((func if self.response_cache is None else cached_get), *args, **kw)
+    except Redirect, redirect:
+      self.redirect(redirect.location)
+    except StopRequest:
+      pass
+  return get_method_wrapper
+
+# sinks receiving (handler class, [(stage name, seconds)], total seconds) for every request, see instrument()
+INSTRUMENTATION_SINKS = []
+
+def instrument(*sinks):
+  """ Starts reporting per-stage timings of every YSHandler request to the given sinks
+  (see yoursway.web.instrumentation); instrument() without sinks stops it. """
+  INSTRUMENTATION_SINKS[:] = sinks
+  for klass in [YSHandler] + all_subclasses(YSHandler):
+    klass.dispatch_request = compile_dispatch_request(*collect_dispatch_pipeline(klass), instrumented=bool(sinks))
+    
+def report_timings(handler_class, timings, total):
+  for sink in INSTRUMENTATION_SINKS:
+    try:
+      sink(handler_class, timings, total)
+    except Exception:
+      logging.exception("Instrumentation sink %r failed", sink)
+
+def call_handler_method(self, func, *args, **kw):
+  func(self, *args, **kw)
+
+# the most concurrently run stages executing on extra threads at once, across all requests of the process
+HOOK_THREADS = 10
+HOOK_SEMAPHORE = threading.BoundedSemaphore(HOOK_THREADS)
+
+def run_hook_thread(step, args, failures, index):
+  with HOOK_SEMAPHORE:
+    try:
+      step(*args)
+    except Exception:
+      failures[index] = sys.exc_info()
+
+def run_concurrently(members, handler, *path_elements):
+  """ Runs (step, path element index or None, is access check) members at once: the first in the calling
+  thread, each of the rest on a thread of its own (waiting for HOOK_SEMAPHORE before starting). Joins them
+  all, then re-raises the exception of the first one that failed. Access checks are given as bare check
+  functions; the request context they share is resolved beforehand and their AccessDenied turned into a
+  login redirect afterwards, both in the calling thread. """
+  if any(check for step, arg_index, check in members):
+    request_context_of(handler).resolve()
+  failures = [None] * len(members)
+  threads = []
+  for index in xrange(1, len(members)):
+    step, arg_index, check = members[index]
+    args = ((handler,) if arg_index is None else (handler, path_elements[arg_index]))
+    thread = threading.Thread(target=run_hook_thread, args=(step, args, failures, index))
+    thread.start()
+    threads.append(thread)
+  step, arg_index, check = members[0]
+  try:
+    if arg_index is None:
+      step(handler)
+    else:
+      step(handler, path_elements[arg_index])
+  except Exception:
+    failures[0] = sys.exc_info()
+  for thread in threads:
+    thread.join()
+  for (step, arg_index, check), failure in zip(members, failures):
+    if failure is not None:
+      if check and isinstance(failure[1], AccessDenied):
+        redirect = login_redirect(handler)
+        if redirect is not None:
+          raise redirect
+      raise failure[0], failure[1], failure[2]
+
+def concurrent_member(step, arg_index):
+  """ Returns the run_concurrently member for a step, unwrapping access checks. """
+  if isinstance(step, functools.partial) and step.func is run_access_check:
+    return (step.args[0], arg_index, True)
+  return (step, arg_index, False)
+
+def group_independent_steps(steps, names, independent):
+  """ Replaces every run of consecutive independent steps with a single step running them concurrently. """
+  grouped_steps, grouped_names = [], []
+  index = 0
+  while index < len(steps):
+    end = index
+    while end < len(steps) and independent[end]:
+      end += 1
+    if end - index < 2:
+      grouped_steps.append(steps[index])
+      grouped_names.append(names[index])
+      index += 1
+      continue
+    run = steps[index:end]
+    arg_indices = [arg_index for step, arg_index in run if arg_index is not None]
+    first = (arg_indices[0] if arg_indices else 0)
+    members = tuple(concurrent_member(step, (None if arg_index is None else arg_index - first)) for step, arg_index in run)
+    grouped_steps.append((functools.partial(run_concurrently, members), slice(first, first + len(arg_indices))))
+    grouped_names.append('|'.join(names[index:end]))
+    index = end
+  return grouped_steps, grouped_names
+
+def add_batch_fetch_step(steps, names, batch, arg_count):
+  """ Adds a run of batch fetchers as a single step taking one path element per fetcher, returns the new arg count. """
+  steps.append((functools.partial(run_batch_fetches, tuple(batch)), slice(arg_count, arg_count + len(batch))))
+  names.append('+'.join(key_func.__name__ for attr, key_func, required in batch))
+  return arg_count + len(batch)
+
+def compile_dispatch_request(decorators, terminal, instrumented=False):
+  """ Folds a list of request decorators into one flat dispatch_request function.
+  
+  Decorators made by fetcher, batch_fetcher, before_request and access_check become
+  plain steps of a loop (consecutive batch fetchers sharing one step, consecutive
+  independent stages running concurrently in one step); any other decorator wraps
+  the pipeline compiled from the decorators following it. """
+  steps = []
+  names = []
+  independent = []
+  arg_count = 0
+  time_terminal = True
+  batch = []
+  for index, dec in enumerate(decorators):
+    stage = getattr(dec, '_request_stage', None)
+    if stage is not None and stage[0] == 'batch_fetch':
+      batch.append(stage[1])
+      continue
+    if batch:
+      arg_count = add_batch_fetch_step(steps, names, batch, arg_count)
+      independent.append(False)
+      batch = []
+    if stage is None:
+      terminal = dec(compile_dispatch_request(decorators[index+1:], terminal, instrumented))
+      time_terminal = False  # the inner pipeline times its own stages
+      break
+    kind, func = stage
+    names.append(func.__name__)
+    independent.append(getattr(dec, '_independent', False))
+    if kind == 'fetch':
+      steps.append((func, arg_count))
+      arg_count += 1
+    elif kind == 'check':
+      steps.append((functools.partial(run_access_check, func), None))
+    else:
+      steps.append((func, None))
+  else:
+    if batch:
+      arg_count = add_batch_fetch_step(steps, names, batch, arg_count)
+      independent.append(False)
+  if any(independent):
+    steps, names = group_independent_steps(steps, names, independent)
+  if instrumented:
+    return compile_instrumented_dispatch_request(steps, names, arg_count, terminal, time_terminal)
+  if not steps:
+    return terminal
+  steps = tuple(steps)
+  
+  def dispatch_request(self, func, *args, **kw):
+    for step, arg_index in steps:
+      if arg_index is None:
+        step(self)
+      elif arg_index.__class__ is slice:
+        step(self, *args[arg_index])
+      else:
+        step(self, args[arg_index])
+    return terminal(self, func, *args[arg_count:], **kw)
+  return dispatch_request
+  
+def compile_instrumented_dispatch_request(steps, names, arg_count, terminal, time_terminal):
+  """ Same as the pipeline built by compile_dispatch_request, but timing every stage. Nested pipelines
+  (behind foreign decorators or super() calls) add their timings to the outermost one, which reports them. """
+  steps = tuple(zip(steps, names))
+  
+  def dispatch_request(self, func, *args, **kw):
+    timings = self.__dict__.get('_stage_timings')
+    outermost = timings is None
+    if outermost:
+      timings = self._stage_timings = []
+      request_start = clock()
+    try:
+      for (step, arg_index), name in steps:
+        start = clock()
+        try:
+          if arg_index is None:
+            step(self)
+          elif arg_index.__class__ is slice:
+            step(self, *args[arg_index])
+          else:
+            step(self, args[arg_index])
+        finally:
+          timings.append((name, clock() - start))
+      if not time_terminal:
+        return terminal(self, func, *args[arg_count:], **kw)
+      start = clock()
+      nested = len(timings)
+      try:
+        return terminal(self, func, *args[arg_count:], **kw)
+      finally:
+        # an overridden dispatch_request calling super() runs a nested pipeline reporting its own stages,
+        # so the terminal is charged only for the time spent outside of them
+        seconds = clock() - start - sum(stage_seconds for stage_name, stage_seconds in timings[nested:])
+        timings.append(((func.__name__ if terminal is call_handler_method else terminal.__name__), seconds))
+    finally:
+      if outermost:
+        del self._stage_timings
+        report_timings(self.__class__, timings, clock() - request_start)
+  return dispatch_request
+  
+def collect_dispatch_pipeline(klass):
+  """ Returns (decorators, terminal) that dispatch_request of the given class must run,
+  following the MRO the same way a chain of super() calls would. """
+  decorators = []
+  for base in klass.__mro__:
+    if '_dispatch_decorators' in base.__dict__:
+      decorators += base.__dict__['_dispatch_decorators']
+      terminal = base.__dict__['_dispatch_terminal']
+      if terminal is not None:
+        return decorators, terminal
+    elif 'dispatch_request' in base.__dict__:
+      return decorators, base.__dict__['dispatch_request']
+  raise TypeError, "%s has no dispatch_request to call" % klass.__name__
+
 class YSHandlerMetaclass(type):
   def __new__(cls, name, bases, dct):
     # wrap GET, POST, HEAD methods
     for k in ('get', 'post', 'head'):
       if k in dct:
-        dct[k] = with_stop_request_support(with_request_decoration_support(dct[k]))
+        dct[k] = (get_method if k == 'get' else request_method)(dct[k])
 
     # decorators = (dec1, dec2) support
     decorators = list(dct.get('decorators', []))
@@ -94,42 +419,90 @@ class YSHandlerMetaclass(type):
       if v is not None and hasattr(v, '_autodecorate_request'):
         decorators.append(v)
         
-    # apply decorators to overloaded dispatch_request
-    dispatch_request = dct.get('dispatch_request')
-    if dispatch_request is None:
-      def dispatch_request(self, func, *args, **kw):
-        super(getattr(self.__class__, '_%s_klass' % name), self).dispatch_request(func, *args, **kw)
-    for dec in reversed(decorators):
-      dispatch_request = dec(dispatch_request)
-    dct['dispatch_request'] = dispatch_request
+    # the decorators of this class and of its bases are compiled into a single
+    # flat dispatch_request, ending with the closest overloaded dispatch_request
+    dct['_dispatch_decorators'] = tuple(decorators)
+    dct['_dispatch_terminal'] = dct.get('dispatch_request')
       
     klass = type.__new__(cls, name, bases, dct)
     setattr(klass, '_%s_klass' % name, klass)
+    klass.dispatch_request = compile_dispatch_request(*collect_dispatch_pipeline(klass), instrumented=bool(INSTRUMENTATION_SINKS))
+    klass._format_methods = build_format_methods(klass)
     return klass
     
+  def __setattr__(cls, name, value):
+    type.__setattr__(cls, name, value)
+    cls.attribute_changed(name)
+      
+  def __delattr__(cls, name):
+    type.__delattr__(cls, name)
+    cls.attribute_changed(name)
+    
+  def attribute_changed(cls, name):
+    if name.startswith('handle_'):
+      EXCEPTION_HANDLERS.clear()
+    if name.rpartition('_')[2] in FORMATS:
+      for klass in [cls] + all_subclasses(cls):
+        klass._format_methods = build_format_methods(klass)
+
+def all_subclasses(klass):
+  result = []
+  for subclass in klass.__subclasses__():
+    result += [subclass] + all_subclasses(subclass)
+  return result
+    
 CAMELCASE_BOUNDARY_RE = re.compile('([a-z0-9])([A-Z])')
 EXCLUDED_EXCEPTION_CLASSES = set((Exception, BaseException, object))
 
-CONTENT_TYPES = (
-  ('html', lambda req: True),
-)
+# exception class -> 'handle_...' method name
+EXCEPTION_HANDLER_NAMES = {}
 
-def recognize_format(request):
-  for format, tester in CONTENT_TYPES:
-    if tester(request):
-      return format
-      
-def can_redirect(request):
-  return request.method == 'GET' and recognize_format(request) == 'html'
+# (handler class, exception class) -> name of the method handling it, filled lazily
+EXCEPTION_HANDLERS = {}
+
+def exception_handler_name(exception_class):
+  try:
+    return EXCEPTION_HANDLER_NAMES[exception_class]
+  except KeyError:
+    name = 'handle_' + CAMELCASE_BOUNDARY_RE.sub('\\1_\\2', exception_class.__name__).lower()
+    EXCEPTION_HANDLER_NAMES[exception_class] = name
+    return name
+
+def resolve_exception_handler(handler_class, exception_class):
+  """ Returns the name of the handler_class method that handles exception_class. """
+  key = (handler_class, exception_class)
+  try:
+    return EXCEPTION_HANDLERS[key]
+  except KeyError:
+    pass
+  method_name = 'handle_unknown_exception'
+  for klass in exception_class.__mro__:
+    if klass not in EXCLUDED_EXCEPTION_CLASSES:
+      name = exception_handler_name(klass)
+      if hasattr(handler_class, name):
+        method_name = name
+        break
+  EXCEPTION_HANDLERS[key] = method_name
+  return method_name
 
 class YSHandler(object):
   __metaclass__ = YSHandlerMetaclass
   
-  def dispatch_request(self, func, *args, **kw):
-    func(self, *args, **kw)
+  dispatch_request = call_handler_method
+  
+  users_api = None  # google.appengine.api.users unless overridden, e.g. with an InMemoryUsers
+  fetch_backend = DatastoreFetchBackend()  # used by batch fetchers, e.g. an InMemoryFetchBackend in tests
+  response_cache = None  # a yoursway.web.responsecache.ResponseCache to serve GET requests from
+  
+  @memoized_property
+  def request_context(self):
+    return RequestContext(self.request, self.users_api)
     
   def switch_on_format(self, func_name_prefix, *args, **kw):
     format = recognize_format(self.request)
+    method = self._format_methods.get((func_name_prefix, format))
+    if method is not None:
+      return method(self, *args, **kw)
     func = getattr(self, func_name_prefix + '_' + format, None)
     if func is None:
       raise BadRequest, "Output in %s format is not supported" % format
@@ -220,16 +593,21 @@ class YSHandler(object):
     pass
     
     
-  @with_stop_request_support
   def dispatch_exception(self, exception, debug_mode):
-    for klass in exception.__class__.__mro__:
-      if klass not in EXCLUDED_EXCEPTION_CLASSES:
-        method_name = 'handle_' + CAMELCASE_BOUNDARY_RE.sub('\\1_\\2', klass.__name__).lower()
-        if hasattr(self, method_name):
-          getattr(self, method_name)(exception, debug_mode)
-          return
-    self.handle_unknown_exception(exception, debug_mode)
+    method_name = resolve_exception_handler(self.__class__, exception.__class__)
+    try:
+      getattr(self, method_name)(exception, debug_mode)
+    except Redirect, redirect:
+      self.redirect(redirect.location)
+    except StopRequest:
+      pass
   
   def handle_exception(self, exception, debug_mode):
-    self.dispatch_exception(exception, debug_mode)
+    if INSTRUMENTATION_SINKS:
+      start = clock()
+      self.dispatch_exception(exception, debug_mode)
+      seconds = clock() - start
+      report_timings(self.__class__, [('dispatch_exception', seconds)], seconds)
+    else:
+      self.dispatch_exception(exception, debug_mode)
     logging.exception("Error processing request because of %s: %s", exception.__class__.__name__, str(exception) )
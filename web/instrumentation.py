@@ -0,0 +1,99 @@
+""" Sinks for the per-stage request timings recorded by YSHandler.
+
+A sink is any callable taking (handler_class, timings, total), where timings is a
+list of (stage name, seconds) pairs in execution order: one per fetcher,
+before_request and access_check function (named after it), one for the handler
+method itself, or a single ('dispatch_exception', seconds) pair for error
+handling. Each stage counts only its own time: an overridden dispatch_request
+that calls super() is reported without the stages of the pipeline it runs.
+total is the wall time of the whole request, not the sum of the stages. Enable instrumentation with yoursway.web.handling.instrument(*sinks).
+
+Stages are timed with clock: time.monotonic where it exists, otherwise the monotonic
+package if it is installed. Python 2 has no monotonic clock of its own, so without that
+package clock is time.time, and a wall clock adjustment during a request skews its timings. """
+
+__all__ = ['clock', 'LoggingSink', 'HistogramSink', 'Histogram']
+
+import time
+import bisect
+import logging
+import threading
+
+try:
+  clock = time.monotonic
+except AttributeError:
+  try:
+    from monotonic import monotonic as clock
+  except ImportError:
+    clock = time.time
+
+class LoggingSink(object):
+  """ Logs a line per request: "ProjectHandler: load_project=1.2ms can_view=0.1ms get=10.5ms total=11.8ms". """
+
+  def __init__(self, level=logging.INFO, logger=logging):
+    self.level = level
+    self.logger = logger
+
+  def __call__(self, handler_class, timings, total):
+    stages = " ".join("%s=%.1fms" % (name, seconds * 1000) for name, seconds in timings)
+    self.logger.log(self.level, "%s: %s total=%.1fms", handler_class.__name__, stages, total * 1000)
+
+class Histogram(object):
+  """ Counts durations into fixed buckets (upper bounds in seconds). """
+
+  BOUNDS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+  def __init__(self):
+    self.counts = [0] * (len(self.BOUNDS) + 1)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def add(self, seconds):
+    self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+    self.count += 1
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+
+  def percentile(self, fraction):
+    """ Returns the upper bound of the bucket holding the given fraction of durations (None if beyond the last bound). """
+    threshold = fraction * self.count
+    seen = 0
+    for bound, count in zip(self.BOUNDS + (None,), self.counts):
+      seen += count
+      if seen >= threshold:
+        return bound
+
+  @property
+  def mean(self):
+    return (self.total / self.count if self.count else 0.0)
+
+class HistogramSink(object):
+  """ Aggregates timings in memory into a Histogram per (handler class name, stage), with the
+  request totals under the stage name '(total)'. """
+
+  def __init__(self):
+    self.histograms = {}
+    self.lock = threading.Lock()
+
+  def __call__(self, handler_class, timings, total):
+    name = handler_class.__name__
+    with self.lock:
+      for stage, seconds in timings + [('(total)', total)]:
+        histogram = self.histograms.get((name, stage))
+        if histogram is None:
+          histogram = self.histograms[(name, stage)] = Histogram()
+        histogram.add(seconds)
+
+  def clear(self):
+    with self.lock:
+      self.histograms.clear()
+
+  def report(self):
+    lines = []
+    for (name, stage), h in sorted(self.histograms.items()):
+      p95 = h.percentile(0.95)
+      lines.append("%-30s %-25s %8d calls %9.2fms mean %9.2fms max  p95 <= %s" % (name, stage, h.count,
+        h.mean * 1000, h.max * 1000, ('%gms' % (p95 * 1000) if p95 is not None else 'inf')))
+    return "\n".join(lines)
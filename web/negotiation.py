@@ -0,0 +1,87 @@
+__all__ = ['FORMATS', 'recognize_format', 'can_redirect', 'negotiate_format', 'parse_accept']
+
+from yoursway.utils.cacheutil import LRUCache
+
+FORMATS = ('html', 'ajaxhtml', 'json', 'xml')
+
+MEDIA_TYPE_FORMATS = {
+  'text/html': 'html',
+  'application/xhtml+xml': 'html',
+  'application/json': 'json',
+  'text/javascript': 'json',
+  'application/javascript': 'json',
+  'application/xml': 'xml',
+  'text/xml': 'xml',
+  '*/*': 'html',
+  'text/*': 'html',
+}
+
+# (Accept header, is XMLHttpRequest) -> format; real clients send only a handful of distinct headers
+FORMAT_CACHE = LRUCache(256)
+
+def specificity(media_type):
+  """ 2 for type/subtype, 1 for type/*, 0 for */*. """
+  if media_type == '*/*':
+    return 0
+  if media_type.endswith('/*'):
+    return 1
+  return 2
+
+def parse_accept(header):
+  """ Returns (media_type, q) pairs of an Accept header, most preferred first: by q, then
+  more specific types before wildcards, then in header order. """
+  result = []
+  for item in header.split(','):
+    params = item.split(';')
+    media_type = params.pop(0).strip().lower()
+    if not media_type:
+      continue
+    q = 1.0
+    for param in params:
+      key, _, value = param.partition('=')
+      if key.strip() == 'q':
+        try:
+          q = float(value)
+        except ValueError:
+          q = 0.0
+    result.append((media_type, q))
+  result.sort(key=lambda pair: (-pair[1], -specificity(pair[0])))
+  return result
+
+def negotiate_format(accept, ajax=False):
+  """ Picks the format of the known media types with the highest q. Ties go to the more specific
+  type, then to the format listed first in FORMATS (so html wins whenever it is named), never to
+  header order: older WebKit sends application/xml ahead of text/html with the same q. """
+  format = 'html'
+  acceptable = [(media_type, q) for media_type, q in parse_accept(accept or '') if q > 0 and media_type in MEDIA_TYPE_FORMATS]
+  if acceptable:
+    top_q = acceptable[0][1]
+    media_type = min((media_type for media_type, q in acceptable if q == top_q),
+                     key=lambda media_type: (-specificity(media_type), FORMATS.index(MEDIA_TYPE_FORMATS[media_type])))
+    format = MEDIA_TYPE_FORMATS[media_type]
+  if format == 'html' and ajax:
+    format = 'ajaxhtml'
+  return format
+
+def recognize_format(request):
+  headers = request.headers
+  key = (headers.get('Accept', ''), headers.get('X-Requested-With') == 'XMLHttpRequest')
+  format = FORMAT_CACHE.get(key)
+  if format is None:
+    format = negotiate_format(*key)
+    FORMAT_CACHE.set(key, format)
+  return format
+
+def can_redirect(request):
+  return request.method == 'GET' and recognize_format(request) == 'html'
+
+def build_format_methods(klass):
+  """ Returns {(prefix, format): method} for all prefix_<format> methods of the given class. """
+  table = {}
+  for name in dir(klass):
+    prefix, _, format = name.rpartition('_')
+    if prefix and format in FORMATS:
+      method = getattr(klass, name)
+      if hasattr(method, '__call__'):
+        table[(prefix, format)] = method
+  return table
@@ -0,0 +1,75 @@
+__all__ = ['RequestContext', 'request_context_of', 'InMemoryUsers']
+
+from yoursway.utils.funcutil import memoized_property
+from yoursway.utils.importutil import lazy_import
+from yoursway.web.negotiation import can_redirect
+
+users = lazy_import('google.appengine.api.users')
+
+class RequestContext(object):
+  """ Answers the questions access checks ask about a request (current user, admin flag,
+  whether a login redirect is possible), each at most once per request.
+  
+  users_api defaults to google.appengine.api.users; pass an InMemoryUsers to use it without App Engine. """
+  
+  def __init__(self, request, users_api=None):
+    self.request = request
+    self.users_api = users_api
+    
+  @memoized_property
+  def users(self):
+    if self.users_api is not None:
+      return self.users_api
+    return users
+    
+  @memoized_property
+  def current_user(self):
+    return self.users.get_current_user()
+    
+  @memoized_property
+  def is_admin(self):
+    return self.users.is_current_user_admin()
+    
+  @memoized_property
+  def can_redirect(self):
+    return can_redirect(self.request)
+    
+  def resolve(self):
+    """ Looks up the current user and admin flag now, e.g. before access checks run on threads
+    that do not see App Engine's per-request environment. """
+    self.current_user
+    self.is_admin
+    
+  def login_url(self):
+    return self.users.create_login_url(self.request.uri)
+
+def request_context_of(handler):
+  """ Returns the RequestContext of a handler: YSHandler keeps one per request, other handlers get a fresh one. """
+  context = getattr(handler, 'request_context', None)
+  if context is None:
+    context = RequestContext(handler.request, getattr(handler, 'users_api', None))
+  return context
+
+class InMemoryUsers(object):
+  """ A stand-in for google.appengine.api.users with a fixed current user; counts the lookups made. """
+  
+  def __init__(self, user=None, admin=False, login_url='/_ah/login?continue=%s'):
+    self.user = user
+    self.admin = admin
+    self.login_url_template = login_url
+    self.calls = {}
+    
+  def count(self, name):
+    self.calls[name] = self.calls.get(name, 0) + 1
+    
+  def get_current_user(self):
+    self.count('get_current_user')
+    return self.user
+    
+  def is_current_user_admin(self):
+    self.count('is_current_user_admin')
+    return self.admin
+    
+  def create_login_url(self, dest_url):
+    self.count('create_login_url')
+    return self.login_url_template % dest_url
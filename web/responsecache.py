@@ -0,0 +1,150 @@
+""" Whole-response caching and conditional GET for YSHandler.
+
+A handler class opts in by declaring a ResponseCache:
+
+  class ProjectFeedHandler(YSHandler):
+    response_cache = ResponseCache(ttl=300, vary=lambda handler: handler.request_context.current_user)
+
+Responses of its get method are then cached per (URL, recognized format, vary(handler)).
+Fetchers and access checks still run for every request; a hit replaces only the handler
+method, so anything that makes its output differ between users must be part of vary.
+Responses setting a cookie are never cached. Every cached response carries ETag and
+Last-Modified headers, and requests whose If-None-Match/If-Modified-Since match get an
+empty 304 response. """
+
+__all__ = ['ResponseCache', 'CachedResponse', 'LRUResponseStore', 'MemcacheResponseStore']
+
+import time
+import hashlib
+import calendar
+from email.utils import formatdate, parsedate
+
+from yoursway.utils.cacheutil import LRUCache
+from yoursway.web.negotiation import recognize_format
+from yoursway.utils.importutil import lazy_import
+
+memcache = lazy_import('google.appengine.api.memcache')
+
+class CachedResponse(object):
+
+  def __init__(self, headers, body, etag, last_modified, expires):
+    self.headers = headers
+    self.body = body
+    self.etag = etag
+    self.last_modified = last_modified
+    self.expires = expires
+
+class LRUResponseStore(object):
+  """ Keeps at most max_size responses in process memory. """
+
+  def __init__(self, max_size=500):
+    self.cache = LRUCache(max_size)
+
+  def get(self, key):
+    return self.cache.get(key)
+
+  def set(self, key, entry, ttl):
+    self.cache.set(key, entry)
+
+  def clear(self):
+    self.cache.clear()
+
+class MemcacheResponseStore(object):
+  """ Shares responses between instances through App Engine memcache (or any client with get/set(key, value, time)). """
+
+  def __init__(self, namespace='yoursway.responses', client=None):
+    self.namespace = namespace
+    self.client = client
+
+  def memcache(self):
+    return (self.client if self.client is not None else memcache)
+
+  def key(self, key):
+    return hashlib.sha1(repr(key)).hexdigest()
+
+  def get(self, key):
+    return self.memcache().get(self.key(key), namespace=self.namespace)
+
+  def set(self, key, entry, ttl):
+    self.memcache().set(self.key(key), entry, time=ttl, namespace=self.namespace)
+
+def http_date(timestamp):
+  return formatdate(timestamp, usegmt=True)
+
+def parse_http_date(value):
+  parsed = parsedate(value)
+  if parsed is None:
+    return None
+  return calendar.timegm(parsed)
+
+def etag_matches(header, etag):
+  if header.strip() == '*':
+    return True
+  return etag in [tag.strip() for tag in header.split(',')]
+
+def body_etag(body):
+  if isinstance(body, unicode):
+    body = body.encode('utf-8')
+  return '"%s"' % hashlib.md5(body).hexdigest()
+
+class ResponseCache(object):
+  """ Caches successful GET responses for ttl seconds in store (a private LRUResponseStore by default). """
+
+  def __init__(self, ttl=60, vary=None, store=None, max_size=500):
+    self.ttl = ttl
+    self.vary = vary
+    self.store = (store if store is not None else LRUResponseStore(max_size))
+
+  def key(self, handler):
+    request = handler.request
+    if self.vary is None:
+      return (request.url, recognize_format(request))
+    return (request.url, recognize_format(request), self.vary(handler))
+
+  def lookup(self, handler):
+    """ Returns the cached response for the handler's request, or None. """
+    entry = self.store.get(self.key(handler))
+    if entry is not None and entry.expires > time.time():
+      return entry
+    return None
+
+  def serve(self, handler, entry):
+    """ Writes a cached response (or a 304 if the client already has it) to the handler's response. """
+    response = handler.response
+    if self.not_modified(handler.request, entry):
+      response.set_status(304)
+    else:
+      for name, value in entry.headers:
+        response.headers[name] = value
+      response.out.write(entry.body)
+    response.headers['ETag'] = entry.etag
+    response.headers['Last-Modified'] = http_date(entry.last_modified)
+
+  def store_response(self, handler):
+    """ Saves the response the handler has just rendered and adds validators to it; turns it into a 304 if the client has it already. """
+    response = handler.response
+    if response.status != 200 or 'Set-Cookie' in response.headers:
+      return
+    body = response.out.getvalue()
+    now = time.time()
+    entry = CachedResponse([(name, value) for name, value in response.headers.items() if name.lower() not in ('etag', 'last-modified')],
+                           body, body_etag(body), int(now), now + self.ttl)
+    self.store.set(self.key(handler), entry, self.ttl)
+    response.headers['ETag'] = entry.etag
+    response.headers['Last-Modified'] = http_date(entry.last_modified)
+    if self.not_modified(handler.request, entry):
+      response.clear()
+      response.set_status(304)
+
+  def not_modified(self, request, entry):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+      return etag_matches(if_none_match, entry.etag)
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if if_modified_since is not None:
+      since = parse_http_date(if_modified_since)
+      return since is not None and since >= entry.last_modified
+    return False
+
+  def clear(self):
+    self.store.clear()
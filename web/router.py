@@ -0,0 +1,179 @@
+""" Matches request paths against a url_mapping (a list of (regex, handler) pairs)
+in a single pass instead of trying every regex in turn.
+
+Routes are filed into a trie under the literal prefix of their regex. Walking
+the trie along the path yields the routes that can possibly match, and those
+are tried through one combined alternation regex that preserves the order of
+the mapping, so the result is always the first matching route. Like webapp,
+regexes are anchored with ^ and $ unless they already are. """
+
+__all__ = ['Router', 'first_match', 'literal_prefix']
+
+import re
+
+REGEX_SPECIAL = set('.^$*+?{}[]\\|()')
+QUANTIFIERS = set('*+?{')
+
+# Python's re refuses patterns with 100 groups or more
+MAX_GROUPS = 99
+
+# regex features that cannot be merged into an alternation with other routes
+STANDALONE_RE = re.compile(r'\(\?[iLmsux]|\(\?P|\\[1-9]|\(\?\(')
+
+def anchor(regex):
+  if not regex.startswith('^'):
+    regex = '^' + regex
+  if not regex.endswith('$'):
+    regex = regex + '$'
+  return regex
+
+def has_top_level_alternation(regex):
+  depth, i, in_class = 0, 0, False
+  while i < len(regex):
+    c = regex[i]
+    if c == '\\':
+      i += 1
+    elif in_class:
+      in_class = (c != ']')
+    elif c == '[':
+      in_class = True
+    elif c == '(':
+      depth += 1
+    elif c == ')':
+      depth -= 1
+    elif c == '|' and depth == 0:
+      return True
+    i += 1
+  return False
+
+def literal_prefix(regex):
+  """ Returns the literal text every path matched by the given (anchored) regex starts with. """
+  if regex.startswith('^'):
+    regex = regex[1:]
+  if has_top_level_alternation(regex) or STANDALONE_RE.search(regex):
+    return ''
+  prefix = []
+  i = 0
+  while i < len(regex):
+    c = regex[i]
+    if c == '\\':
+      if i + 1 >= len(regex) or regex[i+1].isalnum():
+        break
+      c, step = regex[i+1], 2
+    elif c in REGEX_SPECIAL:
+      break
+    else:
+      step = 1
+    if regex[i+step:i+step+1] in QUANTIFIERS:
+      break
+    prefix.append(c)
+    i += step
+  return ''.join(prefix)
+
+def first_match(url_mapping, path):
+  """ The reference behaviour: tries each regex of the mapping in turn. """
+  for regex, handler in url_mapping:
+    match = re.match(anchor(regex), path)
+    if match is not None:
+      return handler, match.groups()
+  return None
+
+class TrieNode(object):
+  __slots__ = ('children', 'routes', 'matchers')
+
+  def __init__(self):
+    self.children = {}
+    self.routes = []
+    self.matchers = None
+
+class Router(object):
+
+  def __init__(self, url_mapping):
+    self.routes = [(anchor(regex), handler) for regex, handler in url_mapping]
+    self.group_counts = [re.compile(regex).groups for regex, handler in self.routes]
+    self.root = TrieNode()
+    for index, (regex, handler) in enumerate(self.routes):
+      node = self.root
+      for c in literal_prefix(regex):
+        node = node.children.setdefault(c, TrieNode())
+      node.routes.append(index)
+
+  def match(self, path):
+    """ Returns (handler, groups) of the first route matching the path, or None. """
+    node = self.root
+    deepest = (node if node.routes else None)
+    for c in path:
+      node = node.children.get(c)
+      if node is None:
+        break
+      if node.routes:
+        deepest = node
+    if deepest is None:
+      return None
+    matchers = deepest.matchers
+    if matchers is None:
+      matchers = deepest.matchers = self.compile_matchers(path)
+    for regex, alternatives in matchers:
+      match = regex.match(path)
+      if match is not None:
+        if alternatives is None:
+          return self.routes[regex.route_index][1], match.groups()
+        handler, start, end = alternatives[match.lastindex]
+        return handler, match.groups()[start:end]
+    return None
+
+  def candidate_routes(self, path):
+    indices = list(self.root.routes)
+    node = self.root
+    for c in path:
+      node = node.children.get(c)
+      if node is None:
+        break
+      indices += node.routes
+    return sorted(indices)
+
+  def compile_matchers(self, path):
+    """ Compiles the routes on the trie chain of the given path into as few regexes as possible. """
+    matchers = []
+    chunk = []
+    for index in self.candidate_routes(path):
+      regex, groups = self.routes[index][0], self.group_counts[index]
+      if STANDALONE_RE.search(regex) or groups + 1 > MAX_GROUPS:
+        matchers += self.compile_chunk(chunk)
+        matchers.append(self.compile_standalone(index))
+        chunk = []
+        continue
+      if sum(g + 1 for i, g in chunk) + groups + 1 > MAX_GROUPS:
+        matchers += self.compile_chunk(chunk)
+        chunk = []
+      chunk.append((index, groups))
+    return matchers + self.compile_chunk(chunk)
+
+  def compile_standalone(self, index):
+    return (StandaloneRegex(self.routes[index][0], index), None)
+
+  def compile_chunk(self, chunk):
+    if not chunk:
+      return []
+    if len(chunk) == 1:
+      return [self.compile_standalone(chunk[0][0])]
+    parts = []
+    alternatives = {}
+    group = 1
+    for index, groups in chunk:
+      regex, handler = self.routes[index]
+      parts.append('(' + regex + ')')
+      alternatives[group] = (handler, group, group + groups)
+      group += groups + 1
+    try:
+      return [(re.compile('|'.join(parts)), alternatives)]
+    except re.error:
+      return [self.compile_standalone(index) for index, groups in chunk]
+
+class StandaloneRegex(object):
+  """ A compiled route regex that remembers which route it belongs to. """
+  __slots__ = ('match', 'route_index')
+
+  def __init__(self, regex, route_index):
+    self.match = re.compile(regex).match
+    self.route_index = route_index
@@ -0,0 +1,177 @@
+""" Compiles Django templates once per process, and optionally once per deployment.
+
+load_template(path) recompiles a template file only when its mtime, or the mtime
+of a template it includes by a constant name (Django compiles those into the
+including tree), changes. With CACHE_DIR set to a writable directory, compiled
+node trees are also pickled there, so a restarted process can skip parsing
+altogether. Pickles are keyed by CACHE_VERSION as well, which must change
+whenever tag code does; they are not used at all without one, or for trees
+including templates that are not files. Trees that cannot be pickled (e.g.
+because a tag keeps a reference to a local function) are simply compiled again. """
+
+__all__ = ['load_template', 'compile_template', 'clear_cache']
+
+import os
+import logging
+import hashlib
+import threading
+import cPickle as pickle
+
+from yoursway.utils.cacheutil import LRUCache
+from yoursway.utils.importutil import lazy_import
+
+django = lazy_import('django')
+django_conf = lazy_import('django.conf')
+django_template = lazy_import('django.template')
+django_loader = lazy_import('django.template.loader')
+
+# directory for pickled templates, None disables the on-disk cache
+CACHE_DIR = None
+
+# version of the code that pickled trees are made of (tag classes), e.g. the deployed app version;
+# None uses App Engine's CURRENT_VERSION_ID, and disables the on-disk cache outside App Engine
+CACHE_VERSION = None
+
+# path -> (mtime, dependencies, template)
+TEMPLATES = {}
+TEMPLATES_LOCK = threading.Lock()
+
+# cache key of template source -> (dependencies, template)
+COMPILED_SOURCES = LRUCache(200)
+
+def cache_version():
+  if CACHE_VERSION is not None:
+    return CACHE_VERSION
+  return os.environ.get('CURRENT_VERSION_ID')
+
+def template_key(source, name):
+  digest = hashlib.sha1()
+  digest.update(django.get_version())
+  digest.update('\0')
+  digest.update(cache_version() or '')
+  digest.update('\0')
+  digest.update(name.encode('utf-8') if isinstance(name, unicode) else name)
+  digest.update('\0')
+  digest.update(source.encode('utf-8') if isinstance(source, unicode) else source)
+  return digest.hexdigest()
+
+def included_templates(nodelist):
+  """ Returns the templates compiled into a node list, recursively: those of nodes that keep a parsed
+  template, like the ConstantIncludeNode of a {% include %} tag with a constant name. """
+  result = []
+  for node in nodelist.get_nodes_by_type(django_template.Node):
+    template = getattr(node, 'template', None)
+    if isinstance(template, django_template.Template):
+      result.append(template)
+      result.extend(included_templates(template.nodelist))
+  return result
+
+def template_file(name):
+  """ Returns the path of the file the template loaders load the given template from, or None. """
+  for loader_name in django_conf.settings.TEMPLATE_LOADERS:
+    loader = django_loader.find_template_loader(loader_name)
+    if loader is None:
+      continue
+    try:
+      source, display_name = getattr(loader, 'load_template_source', loader)(name)
+    except django_template.TemplateDoesNotExist:
+      continue
+    return (display_name if os.path.isfile(display_name) else None)
+  return None
+
+def template_dependencies(template):
+  """ Returns ((path, mtime), ...) of the files included into a template, or None if some of them are not files. """
+  dependencies = []
+  for included in included_templates(template.nodelist):
+    path = template_file(included.name)
+    if path is None:
+      return None
+    dependencies.append((path, os.path.getmtime(path)))
+  return tuple(dependencies)
+
+def dependencies_changed(dependencies):
+  for path, mtime in (dependencies or ()):
+    try:
+      if os.path.getmtime(path) != mtime:
+        return True
+    except OSError:
+      return True
+  return False
+
+def compile_template(source, name='<Unknown Template>'):
+  """ Returns a django Template for the given source, reusing earlier compilations. """
+  return compile_template_with_dependencies(source, name)[1]
+
+def compile_template_with_dependencies(source, name):
+  key = template_key(source, name)
+  cached = COMPILED_SOURCES.get(key)
+  if cached is None or dependencies_changed(cached[0]):
+    cached = load_pickled(key)
+    if cached is None or dependencies_changed(cached[0]):
+      template = django_template.Template(source, name=name)
+      cached = (template_dependencies(template), template)
+      if cached[0] is not None:
+        save_pickled(key, cached)
+    COMPILED_SOURCES.set(key, cached)
+  return cached
+
+def load_template(path):
+  """ Returns a django Template for the given file, recompiling it only when the file or one it includes changes. """
+  mtime = os.path.getmtime(path)
+  cached = TEMPLATES.get(path)
+  if cached is not None and cached[0] == mtime and not dependencies_changed(cached[1]):
+    return cached[2]
+  f = open(path)
+  try:
+    source = f.read()
+  finally:
+    f.close()
+  dependencies, template = compile_template_with_dependencies(source, path)
+  with TEMPLATES_LOCK:
+    TEMPLATES[path] = (mtime, dependencies, template)
+  return template
+
+def pickle_path(key):
+  return os.path.join(CACHE_DIR, key + '.pickle')
+
+def load_pickled(key):
+  """ Returns the (dependencies, template) pair pickled under key, or None. """
+  if CACHE_DIR is None or cache_version() is None:
+    return None
+  try:
+    f = open(pickle_path(key), 'rb')
+  except IOError:
+    return None
+  try:
+    return pickle.load(f)
+  except Exception, e:
+    logging.warn("Cannot load pickled template %s: %s", key, e)
+    return None
+  finally:
+    f.close()
+
+def save_pickled(key, cached):
+  if CACHE_DIR is None or cache_version() is None:
+    return
+  template = cached[1]
+  try:
+    data = pickle.dumps(cached, pickle.HIGHEST_PROTOCOL)
+  except Exception, e:
+    logging.debug("Template %s cannot be pickled: %s", template.name, e)
+    return
+  # write to a temporary file first so that concurrent readers never see a partial pickle
+  temp_path = '%s.%d.tmp' % (pickle_path(key), os.getpid())
+  try:
+    f = open(temp_path, 'wb')
+    try:
+      f.write(data)
+    finally:
+      f.close()
+    os.rename(temp_path, pickle_path(key))
+  except (IOError, OSError), e:
+    logging.warn("Cannot save pickled template %s: %s", template.name, e)
+
+def clear_cache():
+  with TEMPLATES_LOCK:
+    TEMPLATES.clear()
+  COMPILED_SOURCES.clear()
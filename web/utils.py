@@ -1,12 +1,54 @@
+class SafeString(unicode):
+  """ Markup that is already escaped; escape() returns it unchanged. """
+
+  def __html__(self):
+    return self
+
+def mark_escaped(html):
+  if isinstance(html, str):
+    html = unicode(html, 'utf-8')
+  return SafeString(html)
+
+# above this length unicode.replace beats scanning for each special character first
+SHORT_TEXT_LEN = 256
 
 def escape(html):
     """Returns the given HTML with ampersands, quotes and carets encoded."""
-    if not isinstance(html, unicode):
-      if not isinstance(html, str):
+    if type(html) is not unicode:
+      if hasattr(html, '__html__'):
+        return html.__html__()
+      elif not isinstance(html, str):
         html = unicode(html)
       else:
         html = unicode(html, 'utf-8')
-    return html.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&#39;')
+    if len(html) > SHORT_TEXT_LEN:
+      return html.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;').replace("'", '&#39;')
+    if '&' in html: html = html.replace('&', '&amp;')
+    if '<' in html: html = html.replace('<', '&lt;')
+    if '>' in html: html = html.replace('>', '&gt;')
+    if '"' in html: html = html.replace('"', '&quot;')
+    if "'" in html: html = html.replace("'", '&#39;')
+    return html
+
+def escape_attr(value):
+    """Returns the given attribute value escaped. Unlike escape(), this also escapes markup that is
+    already escaped, which could otherwise end the attribute early."""
+    if isinstance(value, str):
+      value = unicode(value, 'utf-8')
+    else:
+      value = unicode(value)
+    return escape(value)
+
+def escape_many(values):
+    """Returns a list of escape(value) for each of the given values.
+    Plain unicode values are escaped together in a single pass over their concatenation."""
+    values = list(values)
+    if not values or not all(type(value) is unicode for value in values):
+      return map(escape, values)
+    joined = u'\0'.join(values)
+    if joined.count(u'\0') != len(values) - 1:
+      return map(escape, values)
+    return escape(joined).split(u'\0')
 
 def js_str(something):
     """Returns a JavaScript string literal representing the given text."""
@@ -16,4 +58,9 @@ def js_str(something):
       text = unicode(something, 'utf-8')
     else:
       text = unicode(something)
-    return "'" + text.replace("'", "\\'").replace('"', '\\"').replace("\n", "\\n") + "'"
+    if len(text) > SHORT_TEXT_LEN:
+      return "'" + text.replace("'", "\\'").replace('"', '\\"').replace("\n", "\\n") + "'"
+    if "'" in text:  text = text.replace("'", "\\'")
+    if '"' in text:  text = text.replace('"', '\\"')
+    if "\n" in text: text = text.replace("\n", "\\n")
+    return "'" + text + "'"
@@ -1,5 +1,8 @@
 
 import re
+import functools
+import itertools
+from collections import deque
     
 class ValidationErrors(object):
   
@@ -16,15 +19,17 @@ class ValidationErrors(object):
     self.messages.setdefault(key, message)
 
 
-class PostbackSession(object):
+class ValidationSession(object):
+  """ Collects values and errors while validating a single source,
+  which is anything with a get(key) method: a webapp request, a dict, a CSV row. """
   
-  def __init__(self, request):
+  def __init__(self, source):
     self.errors = ValidationErrors()
-    self.request = request
+    self.source = source
     self.data = {}
     
   def get(self, key):
-    value = self.request.get(key)
+    value = self.source.get(key)
     self.data[key] = value
     return value
     
@@ -38,30 +43,155 @@ class PostbackSession(object):
   def messages(self):
     return self.errors.messages
     
+  def validate(self, schema):
+    """ Runs all rules of a Schema, returns {key: value}. """
+    return schema(self)
+    
   valid = property(is_valid)
 
 
+class PostbackSession(ValidationSession):
+  
+  def __init__(self, request):
+    super(PostbackSession, self).__init__(request)
+    self.request = request
+
+
+NUMBER_RE = re.compile('^-?[0-9]+$')
+TRUE_VALUES = frozenset(('1', 'yes', 'on', 'True'))
+
+class StringValidator(object):
+  """ Validates a string value: strips it, checks it is present and fits the length limits.
+  Messages are formatted only when the value is invalid. """
+  
+  def __init__(self, required=True, use_none=True, min_len=None, max_len=None,
+        required_message = "Required.",
+        min_len_message = "Please enter at least %(min)d characters.",
+        max_len_message = "Cannot be longer that %(max)d characters."):
+    self.required = required
+    self.empty_value = (None if use_none else "")
+    self.min_len = min_len
+    self.max_len = max_len
+    self.required_message = required_message
+    self.min_len_message = min_len_message
+    self.max_len_message = max_len_message
+    
+  def __call__(self, session, key):
+    raw = value = session.get(key)
+    if value is not None:
+      value = value.strip()
+    if not value:
+      if self.required:
+        session.invalid(key, self.message(self.required_message, key, raw))
+        return value
+      value = self.empty_value
+      if value is None:
+        return value
+    if self.min_len and len(value) < self.min_len:
+      session.invalid(key, self.message(self.min_len_message, key, raw))
+    elif self.max_len and len(value) > self.max_len:
+      session.invalid(key, self.message(self.max_len_message, key, raw))
+    return value
+    
+  def message(self, template, key, value):
+    return template % dict(value=value, key=key, min=self.min_len, max=self.max_len, len=(0 if value is None else len(value)))
+
+class IntValidator(object):
+  """ Validates an integer value given as a string, optionally treating some values (like -1) as missing. """
+  
+  def __init__(self, required=True, min_value=None, max_value=None,
+        required_message = "Required.",
+        not_a_number_message = "Must be a number.",
+        missing_value=None,
+        min_value_message = "Cannot be less than %(minval)d.",
+        max_value_message = "Cannot be greater than %(maxval)d."):
+    self.string = StringValidator(required=required, use_none=True, required_message=required_message)
+    self.required = required
+    self.min_value = min_value
+    self.max_value = max_value
+    self.required_message = required_message
+    self.not_a_number_message = not_a_number_message
+    if missing_value is None:
+      self.missing_values = None
+    elif isinstance(missing_value, (list, tuple, set)):
+      self.missing_values = frozenset(missing_value)
+    else:
+      self.missing_values = frozenset((missing_value,))
+    self.min_value_message = min_value_message
+    self.max_value_message = max_value_message
+    
+  def __call__(self, session, key):
+    s = self.string(session, key)
+    if s is None:
+      return None
+    if not session.is_valid(key):
+      return s
+    if NUMBER_RE.match(s) is None:
+      return session.invalid(key, self.not_a_number_message)
+    i = int(s)
+    if self.missing_values is not None and i in self.missing_values:
+      if self.required:
+        return session.invalid(key, self.required_message)
+      else:
+        return None
+    if self.min_value is not None and i < self.min_value:
+      return session.invalid(key, self.message(self.min_value_message, key, i))
+    if self.max_value is not None and i > self.max_value:
+      return session.invalid(key, self.message(self.max_value_message, key, i))
+    return i
+    
+  def message(self, template, key, value):
+    return template % dict(value=value, key=key, min_value=self.min_value, max_value=self.max_value,
+                           minval=self.min_value, maxval=self.max_value)
+
+class BoolValidator(object):
+  
+  def __call__(self, session, key):
+    return session.get(key) in TRUE_VALUES
+
+class Schema(object):
+  """ A list of (key, validator) rules validated together in one pass.
+  
+  A rule may also be (key, func, options) with a function like valid_string, which
+  is then called as func(session, key, **options). """
+  
+  def __init__(self, rules):
+    self.rules = []
+    for rule in rules:
+      key, validator = rule[0], rule[1]
+      if len(rule) > 2:
+        validator = functools.partial(validator, **rule[2])
+      self.rules.append((key, validator))
+    
+  def __call__(self, session):
+    values = {}
+    for key, validator in self.rules:
+      values[key] = validator(session, key)
+    return values
+
+# validators built by valid_string/valid_int, keyed by (validator class, arguments)
+VALIDATOR_CACHE = {}
+VALIDATOR_CACHE_SIZE = 1000
+
+def cached_validator(klass, *args):
+  key = (klass,) + args
+  try:
+    return VALIDATOR_CACHE[key]
+  except KeyError:
+    validator = klass(*args)
+    if len(VALIDATOR_CACHE) >= VALIDATOR_CACHE_SIZE:
+      VALIDATOR_CACHE.clear()
+    VALIDATOR_CACHE[key] = validator
+    return validator
+  except TypeError:  # unhashable arguments, like a list of missing values
+    return klass(*args)
+
 def valid_string(session, key, required=True, use_none=True, min_len=None, max_len=None,
       required_message = "Required.",
       min_len_message = "Please enter at least %(min)d characters.",
       max_len_message = "Cannot be longer that %(max)d characters."):
-  value = session.get(key)
-  data = dict(value=value, key=key, min=min_len, max=max_len, len=(0 if value==None else len(value)))
-  if value != None:
-    value = value.strip()
-  if value == None or len(value) == 0:
-    if required:
-      session.invalid(key, required_message % data)
-      return value
-    else:
-      value = None if use_none else ""
-  if min_len and len(value) < min_len:
-    session.invalid(key, min_len_message % data)
-    return value
-  if max_len and len(value) > max_len:
-    session.invalid(key, max_len_message % data)
-    return value
-  return value
+  return cached_validator(StringValidator, required, use_none, min_len, max_len,
+    required_message, min_len_message, max_len_message)(session, key)
 
 def valid_int(session, key, required=True, min_value=None, max_value=None,
       required_message = "Required.",
@@ -69,29 +199,53 @@ def valid_int(session, key, required=True, min_value=None, max_value=None,
       missing_value=None,
       min_value_message = "Cannot be less than %(minval)d.",
       max_value_message = "Cannot be greater than %(maxval)d."):
-  s = valid_string(session, key, required=required, use_none=True, required_message=required_message)
-  if s is None:
-    return None
-  if not session.is_valid(key):
-    return s
-  if not re.match('^-?[0-9]+$', s):
-    import logging
-    logging.warn('Not a number: "%s"' % s)
-    return session.invalid(key, not_a_number_message)
-  i = int(s)
-  data = dict(value=i, key=key, min_value=min_value, max_value=max_value)
-  if missing_value is not None:
-    if ((i in missing_value) if isinstance(missing_value, (list, tuple, set)) else (i == missing_value)):
-      if required:
-        return session.invalid(key, required_message)
-      else:
-        return None
-  if min_value != None and i < min_value:
-    return session.invalid(key, min_value_message % data)
-  if max_value != None and i > max_value:
-    return session.invalid(key, max_value_message % data)
-  return i
+  return cached_validator(IntValidator, required, min_value, max_value, required_message, not_a_number_message,
+    missing_value, min_value_message, max_value_message)(session, key)
 
 def valid_bool(session, key):
-  s = session.get(key)
-  return s == '1' or s == 'yes' or s == 'on' or s == 'True'
+  return session.get(key) in TRUE_VALUES
+
+
+def validate_record(schema, record):
+  """ Validates a single dict-like record against a Schema (or a list of rules), returns (values, errors). """
+  if not isinstance(schema, Schema):
+    schema = Schema(schema)
+  session = ValidationSession(record)
+  return session.validate(schema), session.errors
+
+def validate_chunk(schema, records):
+  return [validate_record(schema, record) for record in records]
+
+def validate_records(schema, records, processes=None, chunk_size=500):
+  """ Lazily yields (values, errors) for each record of an iterable, in order.
+  
+  schema is a Schema or a list of its rules, e.g. [('name', StringValidator(max_len=100)),
+  ('age', valid_int, dict(min_value=0))], producing the same values and messages as
+  validating a request with the same rules.
+  
+  With processes, chunks of records are validated in a multiprocessing pool (the schema must
+  be picklable, i.e. use module-level functions); only a few chunks are in flight at any time. """
+  if not isinstance(schema, Schema):
+    schema = Schema(schema)
+  if not processes:
+    for record in records:
+      yield validate_record(schema, record)
+    return
+  
+  from multiprocessing import Pool
+  pool = Pool(processes)
+  try:
+    records = iter(records)
+    pending = deque()
+    while True:
+      while len(pending) < processes * 2:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+          break
+        pending.append(pool.apply_async(validate_chunk, (schema, chunk)))
+      if not pending:
+        break
+      for result in pending.popleft().get():
+        yield result
+  finally:
+    pool.terminate()